@@ -4,7 +4,7 @@ from argparse import ArgumentParser
 from typing import NamedTuple
 
 from .data import Language, default_languages
-from .models.utils import Embedding
+from .models.utils import Embedding, Precision, precisions
 
 
 class Args(NamedTuple):
@@ -19,6 +19,18 @@ class Args(NamedTuple):
     operation: list[str] = ["none", "sum", "prod", "concat"]
     similarity: list[str] = ["cosine"]
     practice: bool = False
+    batch_size: int = 32
+    max_model_memory: float | None = None
+    store: bool = True
+    sweep: bool = False
+    jobs: int = 1
+    subtask2: bool = False
+    precision: Precision = "fp32"
+    layers: str | None = None
+    timing: bool = False
+    memory: bool = False
+    restart: bool = False
+    memo: bool = False
 
     def get_windows(self) -> list[int]:
         """Get the context window sizes."""
@@ -54,6 +66,13 @@ class Args(NamedTuple):
         """Directory."""
         return "results/practice" if self.practice else "results/evaluation"
 
+    @property
+    def max_model_bytes(self) -> int | None:
+        """Memory budget for loaded models (bytes)."""
+        if self.max_model_memory is None:
+            return None
+        return int(self.max_model_memory * 2**30)
+
     @property
     def filename(self) -> str:
         """Filename."""
@@ -69,6 +88,8 @@ class Args(NamedTuple):
             f"{window}"
             f"_operation={'+'.join(self.operation)}"
             f"_similarity={'+'.join(self.similarity)}"
+            f"{'' if self.precision == 'fp32' else f'_precision={self.precision}'}"
+            f"{'' if self.layers is None else f'_layers={self.layers}'}"
             ".csv"
         )
 
@@ -150,6 +171,84 @@ def parse_args() -> Args:
         help="'practice kit'",
     )
 
+    parser.add_argument(
+        "-b",
+        "--batch-size",
+        type=int,
+        default=32,
+        help="contexts per forward pass",
+    )
+
+    parser.add_argument(
+        "--max-model-memory",
+        type=float,
+        help="memory budget for loaded models (GiB)",
+    )
+
+    parser.add_argument(
+        "--no-store",
+        action="store_false",
+        dest="store",
+        help="don't use the on-disk hidden-state store or export static embeddings",
+    )
+
+    parser.add_argument(
+        "--sweep",
+        action="store_true",
+        help="compute every window and operation in one pass (no predictions)",
+    )
+
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="worker processes, each running one language and model at a time",
+    )
+
+    parser.add_argument(
+        "--subtask2",
+        action="store_true",
+        help="also score subtask 2 from the same predictions",
+    )
+
+    parser.add_argument(
+        "--precision",
+        choices=precisions,
+        default="fp32",
+        help="inference precision",
+    )
+
+    parser.add_argument(
+        "--layers",
+        help="hidden states to sum: last, sum-last-k or a comma-separated list "
+        "(default: last for contextual, sum-last-4 for pooled)",
+    )
+
+    parser.add_argument(
+        "--timing",
+        action="store_true",
+        help="record the time and calls of each stage of prediction",
+    )
+
+    parser.add_argument(
+        "--memory",
+        action="store_true",
+        help="record the peak memory of each experiment (slower)",
+    )
+
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="rerun configurations that already have results in the results store",
+    )
+
+    parser.add_argument(
+        "--memo",
+        action="store_true",
+        help="memoize predictions row by row on disk, so only new rows are predicted",
+    )
+
     args = parser.parse_args()
 
     return Args(
@@ -162,4 +261,77 @@ def parse_args() -> Args:
         args.operation,
         args.similarity,
         args.practice,
+        args.batch_size,
+        args.max_model_memory,
+        args.store,
+        args.sweep,
+        args.jobs,
+        args.subtask2,
+        args.precision,
+        args.layers,
+        args.timing,
+        args.memory,
+        args.restart,
+        args.memo,
+    )
+
+
+def add_model_arguments(parser: ArgumentParser) -> None:
+    """Command-line arguments for a single model configuration."""
+
+    parser.add_argument(
+        "-e",
+        "--embedding",
+        default="static",
+        help="embedding",
+    )
+
+    parser.add_argument(
+        "-m",
+        "--model-name",
+        default="bert-base-multilingual-cased",
+        help="model name",
+    )
+
+    parser.add_argument(
+        "-w",
+        "--window",
+        type=int,
+        default=0,
+        help="context-window size",
+    )
+
+    parser.add_argument(
+        "-o",
+        "--operation",
+        default="none",
+        help="context-window operation",
+    )
+
+    parser.add_argument(
+        "-s",
+        "--similarity",
+        default="cosine",
+        help="similarity measure",
+    )
+
+    parser.add_argument(
+        "-b",
+        "--batch-size",
+        type=int,
+        default=32,
+        help="contexts per forward pass",
+    )
+
+    parser.add_argument(
+        "--precision",
+        choices=precisions,
+        default="fp32",
+        help="inference precision",
+    )
+
+    parser.add_argument(
+        "--layers",
+        help="hidden states to sum: last, sum-last-k or a comma-separated list "
+        "(default: last for contextual, sum-last-4 for pooled)",
     )
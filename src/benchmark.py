@@ -0,0 +1,353 @@
+"""
+A script to benchmark the hot paths separately (model load, tokenization, forward pass,
+`_find`, `_compose` for each operation and window, and `_similarity`) for each
+embedding, on real and synthetic data. Results are appended as JSON lines, with the
+commit and machine, so that runs can be compared.
+"""
+
+# pylint: disable=protected-access,cell-var-from-loop
+
+import json
+import os
+import platform
+import subprocess
+from argparse import ArgumentParser
+from datetime import datetime, timezone
+from random import Random
+from statistics import median
+from time import perf_counter
+from typing import Callable
+
+import numpy
+import torch
+import transformers
+from numpy import array, str_
+
+from .data import load_x
+from .models.base import BaseModel, columns
+from .models.cache import hidden_state_cache, token_cache
+from .models.meta import MetaModel
+from .models.pool import model_pool
+from .models.utils import ArrayStr, embeddings
+from .params import operations
+
+BENCHMARK_PATH = "results/benchmark/benchmark.jsonl"
+
+
+def measure(function: Callable[[], object], items: int, repeat: int) -> dict:
+    """Best and median time of `repeat` calls, and throughput and latency per item."""
+
+    times = []
+    for _ in range(repeat):
+        start = perf_counter()
+        function()
+        times.append(perf_counter() - start)
+
+    best = min(times)
+    return {
+        "items": items,
+        "repeat": repeat,
+        "best_s": best,
+        "median_s": median(times),
+        "items_per_s": items / best if best > 0 else None,
+        "latency_us": best / items * 1e6 if items else None,
+    }
+
+
+def synthetic_data(rows: int, context_length: int, seed: int = 42) -> ArrayStr:
+    """Rows of random lower-case words, with the word pairs taken from the contexts."""
+
+    random = Random(seed)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+
+    def word() -> str:
+        return "".join(random.choices(letters, k=random.randint(3, 8)))
+
+    data = []
+    for _ in range(rows):
+        word1, word2 = word(), word()
+        context1 = [word() for _ in range(context_length)]
+        context2 = [word() for _ in range(context_length)]
+        for context in [context1, context2]:
+            position1, position2 = random.sample(range(context_length), 2)
+            context[position1], context[position2] = word1, word2
+        data.append(
+            [
+                word1,
+                word2,
+                " ".join(context1),
+                " ".join(context2),
+                word1,
+                word2,
+                word1,
+                word2,
+            ]
+        )
+
+    return array(data, dtype=str_)
+
+
+def benchmark_stages(
+    estimator: BaseModel,
+    x: ArrayStr,
+    windows: list[int],
+    repeat: int,
+) -> list[dict]:
+    """Benchmark each stage of prediction for an estimator."""
+
+    results = []
+    contexts = list(dict.fromkeys(list(x[:, 2]) + list(x[:, 3])))
+    targets = [
+        (row[word_context], row[context])
+        for row in x
+        for _, context, word_context in columns
+    ]
+
+    model_pool.clear()
+    results.append(
+        {
+            "stage": "load",
+            **measure(lambda: (estimator.model, estimator.tokenizer), 1, 1),
+        }
+    )
+
+    def tokenize():
+        token_cache.clear()
+        for context in contexts:
+            estimator._encoding(context)
+
+    results.append({"stage": "tokenize", **measure(tokenize, len(contexts), repeat)})
+
+    # The token cache is now full, so the stages below don't tokenize (except the
+    # batched forward passes of the contextual models).
+    def find():
+        token_cache.spans.clear()
+        for word_context, context in targets:
+            estimator._find(word_context, context)
+
+    results.append({"stage": "find", **measure(find, len(targets), repeat)})
+
+    results.append(
+        {
+            "stage": "forward",
+            **measure(
+                lambda: estimator._batch_embeddings(contexts), len(contexts), repeat
+            ),
+        }
+    )
+
+    hidden_state_cache.clear()
+    context_embeddings = estimator._context_embeddings(contexts)
+
+    for operation in operations:
+        for window in windows if operation != "none" else [0]:
+            estimator.context_window_operation = operation
+            estimator.context_window_size = window
+
+            slices = [
+                context_embeddings[context][
+                    slice(*estimator._context_window("", context, word_context))
+                ]
+                for word_context, context in targets
+            ]
+
+            results.append(
+                {
+                    "stage": "compose",
+                    "operation": operation,
+                    "window": window,
+                    **measure(
+                        lambda: [
+                            estimator._compose(embeddings) for embeddings in slices
+                        ],
+                        len(slices),
+                        repeat,
+                    ),
+                }
+            )
+
+            composed = estimator._compose_rows(x, context_embeddings)
+            pairs = list(
+                zip([*composed[0], *composed[2]], [*composed[1], *composed[3]])
+            )
+
+            results.append(
+                {
+                    "stage": "similarity",
+                    "operation": operation,
+                    "window": window,
+                    **measure(
+                        lambda: [estimator._similarity(*pair) for pair in pairs],
+                        len(pairs),
+                        repeat,
+                    ),
+                }
+            )
+
+            results.append(
+                {
+                    "stage": "similarities",
+                    "operation": operation,
+                    "window": window,
+                    **measure(
+                        lambda: estimator._changes(*composed), len(pairs), repeat
+                    ),
+                }
+            )
+
+    hidden_state_cache.clear()
+    token_cache.clear()
+
+    return results
+
+
+def environment() -> dict:
+    """Commit, machine and library versions."""
+
+    def git(*command: str) -> str | None:
+        try:
+            return subprocess.run(
+                ["git", *command], capture_output=True, check=True, text=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "commit": git("rev-parse", "HEAD"),
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "node": platform.node(),
+        "system": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "torch_threads": torch.get_num_threads(),
+        "python": platform.python_version(),
+        "numpy": numpy.__version__,
+        "torch": torch.__version__,
+        "transformers": transformers.__version__,
+    }
+
+
+def run_benchmarks():
+    """Run the benchmarks."""
+
+    parser = ArgumentParser()
+
+    parser.add_argument(
+        "-e",
+        "--embedding",
+        nargs="+",
+        default=embeddings,
+        help="embeddings",
+    )
+
+    parser.add_argument(
+        "-m",
+        "--model-name",
+        nargs="+",
+        default=["bert-base-multilingual-cased"],
+        help="model names",
+    )
+
+    parser.add_argument(
+        "-l",
+        "--language",
+        nargs="+",
+        default=["en"],
+        help="languages of the real data",
+    )
+
+    parser.add_argument(
+        "-w",
+        "--window",
+        nargs="+",
+        type=int,
+        default=[1, 2, 4, 8],
+        help="context-window sizes",
+    )
+
+    parser.add_argument(
+        "-n",
+        "--rows",
+        type=int,
+        default=256,
+        help="rows of synthetic data",
+    )
+
+    parser.add_argument(
+        "--context-length",
+        type=int,
+        default=64,
+        help="words per synthetic context",
+    )
+
+    parser.add_argument(
+        "-r",
+        "--repeat",
+        type=int,
+        default=3,
+        help="repetitions of each measurement",
+    )
+
+    parser.add_argument(
+        "-b",
+        "--batch-size",
+        type=int,
+        default=32,
+        help="contexts per forward pass",
+    )
+
+    parser.add_argument(
+        "--output",
+        default=BENCHMARK_PATH,
+        help="JSON-lines file to append to",
+    )
+
+    args = parser.parse_args()
+
+    datasets = {
+        **{
+            f"real_{language}": load_x(language).to_numpy().astype(str_)
+            for language in args.language
+        },
+        "synthetic": synthetic_data(args.rows, args.context_length),
+    }
+
+    run = environment()
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+
+    for model_name in args.model_name:
+        for embedding in args.embedding:
+            for data, x in datasets.items():
+                if len(x) == 0:
+                    print(f"{model_name} {embedding} {data}: no rows, skipped")
+                    continue
+
+                estimator = MetaModel(
+                    embedding, model_name, batch_size=args.batch_size
+                )._estimator
+
+                for result in benchmark_stages(estimator, x, args.window, args.repeat):
+                    record = {
+                        **run,
+                        "embedding": embedding,
+                        "model_name": model_name,
+                        "data": data,
+                        "rows": len(x),
+                        "operation": None,
+                        "window": None,
+                        **result,
+                    }
+                    latency = result["latency_us"]
+                    print(
+                        f"{model_name} {embedding} {data} {result['stage']}"
+                        f" {result.get('operation') or ''} {result.get('window') or ''}"
+                        f" {'-' if latency is None else f'{latency:.1f}'} us"
+                    )
+                    with open(args.output, "a", encoding="utf-8") as file:
+                        file.write(json.dumps(record) + "\n")
+
+
+if __name__ == "__main__":
+    run_benchmarks()
@@ -0,0 +1,155 @@
+"""
+A script to compile the datasets for a tokenizer: cleaned contexts, token IDs and
+offsets, target-word spans and gold-standard values in one binary file.
+"""
+
+# pylint: disable=protected-access
+
+import json
+import os
+from typing import NamedTuple
+
+from numpy import array, cumsum, float64, int32, int64, load, savez, str_
+
+from .data import data_hash, default_languages, load_x, load_y
+from .models.base import columns
+from .models.cache import Encoding, token_cache
+from .models.pool import model_revision
+from .models.static import StaticBertModel
+from .models.utils import ArrayFloat, ArrayStr
+from .params import get_model_names
+
+COMPILED_DIRECTORY = "cache/compiled"
+
+
+class Compiled(NamedTuple):
+    """Compiled dataset."""
+
+    x: ArrayStr
+    y: ArrayFloat
+
+
+def compiled_path(model_name: str, language: str, practice: bool = False) -> str:
+    """Path to a compiled dataset."""
+
+    prefix = "practice" if practice else "evaluation"
+    return (
+        f"{COMPILED_DIRECTORY}/{prefix}_{language}"
+        f"_model_name={model_name.replace('/', '-')}.npz"
+    )
+
+
+def fingerprint(model_name: str, language: str, practice: bool = False) -> str:
+    """Dataset contents and tokenizer revision that a compiled dataset depends on."""
+
+    return json.dumps(
+        {
+            "data": data_hash(language, practice),
+            "revision": model_revision(model_name),
+        }
+    )
+
+
+def compile_data(model_name: str, language: str, practice: bool = False) -> str:
+    """Compile a dataset for the tokenizer of a model."""
+
+    x = load_x(language, practice).to_numpy().astype(str_)
+    y = load_y(language, practice).to_numpy().astype(float64)
+
+    model = StaticBertModel(model_name, 0, "none", "cosine")
+
+    contexts = list(dict.fromkeys(list(x[:, 2]) + list(x[:, 3])))
+    encodings = [model._encoding(context) for context in contexts]
+
+    spans = array(
+        [
+            [
+                model._span(row[word_context], row[context])
+                for _word, context, word_context in columns
+            ]
+            for row in x
+        ],
+        dtype=int64,
+    )
+
+    path = compiled_path(model_name, language, practice)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    savez(
+        path,
+        fingerprint=array(fingerprint(model_name, language, practice)),
+        x=x,
+        y=y,
+        contexts=array(contexts, dtype=str_),
+        token_offsets=cumsum([0] + [len(encoding.ids) for encoding in encodings]),
+        ids=array(
+            [token for encoding in encodings for token in encoding.ids], dtype=int32
+        ),
+        offsets=array(
+            [offset for encoding in encodings for offset in encoding.offsets],
+            dtype=int32,
+        ).reshape(-1, 2),
+        spans=spans,
+    )
+
+    return path
+
+
+def is_fresh(path: str, model_name: str, language: str, practice: bool = False) -> bool:
+    """
+    Whether a compiled dataset exists and was compiled from the current data and
+    tokenizer.
+    """
+
+    if not os.path.exists(path):
+        return False
+
+    with load(path) as compiled:
+        return str(compiled["fingerprint"]) == fingerprint(
+            model_name, language, practice
+        )
+
+
+def load_compiled(model_name: str, language: str, practice: bool = False) -> Compiled:
+    """
+    Load a compiled dataset and fill the token cache with its encodings and spans. The
+    dataset is (re)compiled if it is missing or the data or tokenizer has changed.
+    """
+
+    path = compiled_path(model_name, language, practice)
+
+    if not is_fresh(path, model_name, language, practice):
+        compile_data(model_name, language, practice)
+
+    with load(path) as compiled:
+        x = compiled["x"]
+        y = compiled["y"]
+        token_offsets = compiled["token_offsets"].tolist()
+        ids = compiled["ids"].tolist()
+        offsets = [tuple(offset) for offset in compiled["offsets"].tolist()]
+
+        for index, context in enumerate(compiled["contexts"].tolist()):
+            start, end = token_offsets[index], token_offsets[index + 1]
+            token_cache.encodings[model_name, context] = Encoding(
+                ids[start:end], offsets[start:end]  # type: ignore
+            )
+
+        for row, spans in zip(x.tolist(), compiled["spans"].tolist()):
+            for (_word, context, word_context), span in zip(columns, spans):
+                key = (model_name, row[context], row[word_context])
+                token_cache.spans[key] = tuple(span)  # type: ignore
+
+    return Compiled(x, y)
+
+
+def compile_all():
+    """Compile the datasets for every language and model."""
+
+    for language in default_languages:
+        for model_name in get_model_names(language):
+            for practice in [False, True] if language != "fi" else [False]:
+                print(compile_data(model_name, language, practice))
+
+
+if __name__ == "__main__":
+    compile_all()
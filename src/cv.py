@@ -2,20 +2,23 @@
 A script to run specific subtask 1 experiments.
 """
 
-# pylint: disable=redefined-outer-name
+# pylint: disable=protected-access,redefined-outer-name,import-outside-toplevel
 
+from argparse import ArgumentParser
 from os import makedirs
+from time import perf_counter
+from typing import TYPE_CHECKING
 
+from numpy import mean, std
 from pandas import DataFrame
-from sklearn.model_selection import (
-    BaseCrossValidator,
-    BaseShuffleSplit,
-    GridSearchCV,
-    ShuffleSplit,
-)
+from scipy.spatial.distance import correlation
 
-from .data import load_x, load_y
+from .compiled import load_compiled
+from .models.cache import hidden_state_cache
+from .models.memory import memory_tracker
 from .models.meta import MetaModel
+from .models.store import prime
+from .models.timing import timer
 from .params import Params
 from .params_best import (
     en_contextual,
@@ -32,7 +35,18 @@ from .params_best import (
     sl_static,
 )
 
-CV = int | BaseCrossValidator | BaseShuffleSplit | None
+if TYPE_CHECKING:
+    from sklearn.model_selection import BaseCrossValidator, BaseShuffleSplit
+
+    CV = int | BaseCrossValidator | BaseShuffleSplit | None
+
+
+def default_cv() -> "CV":
+    """Ten shuffled splits, each with 90% of the data for testing."""
+
+    from sklearn.model_selection import ShuffleSplit
+
+    return ShuffleSplit(n_splits=10, test_size=0.9, random_state=42)
 
 
 def param_grid_params(params: Params):
@@ -47,20 +61,40 @@ def param_grid_params(params: Params):
     }
 
 
+def load_cv(params: Params, practice: bool = False):
+    """Load the data and fill the hidden-state cache for cross-validation."""
+
+    x, y = load_compiled(params.model_name, params.language, practice)
+    y = y[:, 2]
+
+    hidden_state_cache.clear()
+
+    if params.embedding != "static":
+        prime(
+            MetaModel(params.embedding, params.model_name)._estimator,
+            list(x[:, 2]) + list(x[:, 3]),
+            params.language,
+            practice,
+        )
+
+    return x, y
+
+
 def search_cv(
     params: Params,
     practice: bool = False,
-    cv: CV = ShuffleSplit(n_splits=10, test_size=0.9, random_state=42),
+    cv: "CV" = None,
 ):
-    """Hyperparameter search over cross-validation folds."""
+    """Hyperparameter search over cross-validation folds (by default, `default_cv`)."""
+
+    from sklearn.model_selection import GridSearchCV
 
-    x = load_x(params.language, practice).to_numpy()
-    y = load_y(params.language, practice).to_numpy()[:, 2]
+    x, y = load_cv(params, practice)
 
     search_cv = GridSearchCV(
         MetaModel(),
         param_grid=param_grid_params(params),
-        cv=cv,
+        cv=default_cv() if cv is None else cv,
         verbose=4,
     ).fit(x, y)
 
@@ -84,10 +118,73 @@ def search_cv(
     return search_cv.best_params_, results, split_test_scores
 
 
-def save_cv_result(params: Params):
-    """Save cross-validation results."""
+def search_cv_predictions(
+    params: Params,
+    practice: bool = False,
+    cv: "CV" = None,
+):
+    """
+    Cross-validation from one set of predictions (by default, `default_cv`).
+    `MetaModel.fit` is a no-op, so each fold is scored by indexing into the predictions
+    for every row. The time to predict is shared equally between the folds' score
+    times.
+    """
+
+    from sklearn.model_selection import check_cv
+
+    x, y = load_cv(params, practice)
+
+    # The same keys, in the same order, as `GridSearchCV.best_params_`.
+    best_params = {
+        key: values[0] for key, values in sorted(param_grid_params(params).items())
+    }
+
+    model = MetaModel(**best_params)
 
-    best_params, results, split_test_scores = search_cv(params)
+    start = perf_counter()
+    predictions = model.predict(x)
+    predict_time = perf_counter() - start
+
+    splits = list(check_cv(default_cv() if cv is None else cv).split(x, y))
+
+    fit_times: list[float] = []
+    score_times: list[float] = []
+    split_test_scores: list[float] = []
+
+    for train, test in splits:
+        start = perf_counter()
+        model.fit(x[train], y[train])
+        fit_times.append(perf_counter() - start)
+
+        start = perf_counter()
+        split_test_scores.append(
+            1.0 - float(correlation(predictions[test], y[test], centered=False))
+        )
+        score_times.append(perf_counter() - start + predict_time / len(splits))
+
+    results = {
+        "best_score": mean(split_test_scores),
+        "mean_fit_time": mean(fit_times),
+        "std_fit_time": std(fit_times),
+        "mean_score_time": mean(score_times),
+        "std_score_time": std(score_times),
+    }
+
+    return best_params, results, split_test_scores
+
+
+def save_cv_result(params: Params, reuse_predictions: bool = True):
+    """
+    Save cross-validation results, with the time and calls of each stage and the peak
+    memory if timing and memory tracking are enabled.
+    """
+
+    timer.reset()
+
+    with memory_tracker:
+        best_params, results, split_test_scores = (
+            search_cv_predictions(params) if reuse_predictions else search_cv(params)
+        )
 
     results_dataframe = DataFrame.from_records(
         [{"language": params.language, **best_params, **results}]
@@ -107,6 +204,12 @@ def save_cv_result(params: Params):
         "std_score_time",
     ]
 
+    if timer.enabled:
+        results_dataframe = results_dataframe.assign(**timer.results())
+
+    if memory_tracker.enabled:
+        results_dataframe = results_dataframe.assign(**memory_tracker.results())
+
     split_test_scores_dataframe = DataFrame.from_records(
         {
             "language": params.language,
@@ -159,4 +262,20 @@ def save_cv_results():
 
 
 if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument(
+        "--timing",
+        action="store_true",
+        help="record the time and calls of each stage of prediction",
+    )
+    parser.add_argument(
+        "--memory",
+        action="store_true",
+        help="record the peak memory of each search (slower)",
+    )
+    args = parser.parse_args()
+
+    timer.enabled = args.timing
+    memory_tracker.enabled = args.memory
+
     save_cv_results()
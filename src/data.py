@@ -1,5 +1,6 @@
 """Utilities to load and pre-process data."""
 
+from hashlib import sha256
 from typing import Literal
 
 from pandas import read_csv
@@ -19,14 +20,34 @@ default_languages: list[Language] = [
 ]
 
 
+def x_path(language: str, practice: bool = False) -> str:
+    """Path to the evaluation data."""
+
+    prefix = "practice" if practice else "evaluation"
+    return f"./data/{prefix}_kit_final/data/data_{language}.tsv"
+
+
+def y_path(language: str, practice: bool = False) -> str:
+    """Path to the gold-standard values."""
+
+    prefix = "practice_kit_final/" if practice else ""
+    return f"./data/{prefix}gold/gold_{language}.tsv"
+
+
+def data_hash(language: str, practice: bool = False) -> str:
+    """Hash of the contents of the evaluation data and gold-standard values."""
+
+    digest = sha256()
+    for path in [x_path(language, practice), y_path(language, practice)]:
+        with open(path, "rb") as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+
 def load_x(language: str, practice: bool = False):
     """Load the evaluation data."""
 
-    prefix = "practice" if practice else "evaluation"
-    x = read_csv(
-        f"./data/{prefix}_kit_final/data/data_{language}.tsv",
-        sep="\t",
-    )
+    x = read_csv(x_path(language, practice), sep="\t")
     x["context1"] = x["context1"].apply(remove_strong_tags)
     x["context2"] = x["context2"].apply(remove_strong_tags)
     return x
@@ -35,8 +56,7 @@ def load_x(language: str, practice: bool = False):
 def load_y(language: str, practice: bool = False):
     """Load the gold-standard values."""
 
-    prefix = "practice_kit_final/" if practice else ""
-    return read_csv(f"./data/{prefix}gold/gold_{language}.tsv", sep="\t")
+    return read_csv(y_path(language, practice), sep="\t")
 
 
 def load(language: str):
@@ -0,0 +1,77 @@
+"""
+A script to check that the entry points import within their time budgets, and without
+importing heavy libraries that are only needed to run models or statistical tests.
+"""
+
+import json
+import subprocess
+import sys
+
+heavy_modules = ["torch", "transformers", "scikit_posthocs", "sklearn.model_selection"]
+
+# Import-time budgets (seconds).
+budgets = {
+    "src.utils": 1.0,
+    "src.stats": 1.0,
+    "src.stats_best": 1.0,
+    "src.cv": 2.0,
+    "src.compiled": 2.0,
+    "src.predict": 2.0,
+    "src.results": 1.0,
+    "src.subtask1": 2.0,
+}
+
+IMPORT_TIME = """
+import importlib, json, sys, time
+start = time.perf_counter()
+importlib.import_module({module!r})
+time = time.perf_counter() - start
+print(json.dumps({{"time": time, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def import_time(module: str, repeat: int = 3) -> tuple[float, list[str]]:
+    """Best time to import a module in a fresh interpreter, and the heavy modules."""
+
+    times = []
+    heavy: list[str] = []
+
+    for _ in range(repeat):
+        output = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                IMPORT_TIME.format(module=module, heavy=heavy_modules),
+            ],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout
+        result = json.loads(output.splitlines()[-1])
+        times.append(result["time"])
+        heavy = result["heavy"]
+
+    return min(times), heavy
+
+
+def check_import_budgets() -> bool:
+    """Check every entry point, printing a line for each."""
+
+    passed = True
+
+    for module, budget in budgets.items():
+        time, heavy = import_time(module)
+        ok = time <= budget and not heavy
+        passed = passed and ok
+
+        print(
+            f"{'ok' if ok else 'FAIL':4} {module:16} {time:.3f} s "
+            f"(budget {budget:.1f} s)"
+            + (f", imports {', '.join(heavy)}" if heavy else "")
+        )
+
+    return passed
+
+
+if __name__ == "__main__":
+    sys.exit(0 if check_import_budgets() else 1)
@@ -1,26 +1,95 @@
 """Base model."""
 
-from numpy import apply_along_axis, array, str_
+from collections import OrderedDict
+from hashlib import sha256
+from math import isnan, nan
+from time import perf_counter
+from typing import NamedTuple
+
+from numpy import array, clip, concatenate, einsum, empty, float64, sqrt, stack, str_
 from scipy.spatial.distance import correlation, cosine
+from scipy.stats import pearsonr, spearmanr
 from sklearn.base import BaseEstimator
 
+from .memo import PredictionMemo
+from .pool import model_revision
+from .timing import timed
 from .utils import ArrayFloat, ArrayStr, padflat
 
+# Columns of (word, context, word_context) for word1_context1, word2_context1,
+# word1_context2 and word2_context2.
+columns = [(0, 2, 4), (1, 2, 5), (0, 3, 6), (1, 3, 7)]
+
+
+class Evaluation(NamedTuple):
+    """Predictions, Pearson correlation coefficient and per-stage timings (seconds)."""
+
+    predictions: ArrayFloat
+    score: float
+    timings: dict[str, float]
+    similarities: ArrayFloat
+
+
+def pearson(predictions: ArrayFloat, y: ArrayFloat) -> float:
+    """Uncentred Pearson correlation coefficient (subtask 1)."""
+
+    return 1.0 - float(correlation(predictions, y, centered=False))
+
+
+def subtask2_scores(similarities: ArrayFloat, y: ArrayFloat) -> dict[str, float]:
+    """
+    Pearson and Spearman correlation coefficients, and their harmonic mean, between the
+    predicted and gold-standard similarities in both contexts (subtask 2).
+    """
+
+    predicted = concatenate([similarities[:, 0], similarities[:, 1]])
+    actual = concatenate([y[:, 0], y[:, 1]])
+
+    pearson_score = float(pearsonr(predicted, actual)[0])
+    spearman_score = float(spearmanr(predicted, actual)[0])
+
+    # Constant predictions have no correlation (NaN), and opposite correlations no
+    # harmonic mean.
+    harmonic_mean = (
+        nan
+        if isnan(pearson_score)
+        or isnan(spearman_score)
+        or pearson_score + spearman_score == 0.0
+        else 2 * pearson_score * spearman_score / (pearson_score + spearman_score)
+    )
+
+    return {
+        "subtask2_pearson": pearson_score,
+        "subtask2_spearman": spearman_score,
+        "subtask2": harmonic_mean,
+    }
+
+
+# Similarities (rows, 3) and per-stage timings of a prediction.
+Prediction = tuple[ArrayFloat, dict[str, float]]
+
 
 class BaseModel(BaseEstimator):
     """Base model."""
 
+    # Datasets whose predictions are memoized, least recently used first out.
+    memo_size = 16
+
     def __init__(
         self,
         model_name: str,
         context_window_size: int,
         context_window_operation: str,
         similarity_measure: str,
+        batch_size: int = 32,
     ):
         self.model_name = model_name
         self.context_window_size = context_window_size
         self.context_window_operation = context_window_operation
         self.similarity_measure = similarity_measure
+        self.batch_size = batch_size
+        self._memo: OrderedDict[tuple, Prediction] = OrderedDict()
+        self._row_memo: PredictionMemo | None = None
 
     def _encode(self, text: str | list[str]) -> list[int]:
         raise NotImplementedError
@@ -28,8 +97,14 @@ class BaseModel(BaseEstimator):
     def _decode(self, tokens: list[int]) -> list[str]:
         raise NotImplementedError
 
+    def _span(self, word: str, context: str) -> tuple[int, int]:
+        tokens = self._encode(word)
+        start = self._encode(context).index(tokens[0])
+        return start, start + len(tokens)
+
+    @timed("find")
     def _find(self, word: str, context: str) -> int:
-        return self._encode(context).index(self._encode(word)[0])
+        return self._span(word, context)[0]
 
     def _context_window(
         self, _word: str, context: str, word_context: str
@@ -40,6 +115,7 @@ class BaseModel(BaseEstimator):
             index + self.context_window_size + 1,
         )
 
+    @timed("compose")
     def _compose(
         self,
         embeddings: ArrayFloat,
@@ -58,9 +134,31 @@ class BaseModel(BaseEstimator):
             f"Unknown context window operation: {self.context_window_operation}"
         )
 
-    def _embedding(self, _word: str, _context: str, _word_context: str) -> ArrayFloat:
+    def _embeddings(self, _context: str) -> ArrayFloat:
         raise NotImplementedError
 
+    def _batch_embeddings(self, contexts: list[str]) -> list[ArrayFloat]:
+        return [self._embeddings(context) for context in contexts]
+
+    def _context_embeddings(self, contexts: list[str]) -> dict[str, ArrayFloat]:
+        unique = list(dict.fromkeys(contexts))
+        return dict(zip(unique, self._batch_embeddings(unique)))
+
+    def _window_embedding(
+        self, embeddings: ArrayFloat, word: str, context: str, word_context: str
+    ) -> ArrayFloat:
+        if self.context_window_operation == "none" or self.context_window_size == 0:
+            return embeddings[self._find(word_context, context)]
+
+        start, end = self._context_window(word, context, word_context)
+        return self._compose(embeddings[start:end])
+
+    def _embedding(self, word: str, context: str, word_context: str) -> ArrayFloat:
+        return self._window_embedding(
+            self._embeddings(context), word, context, word_context
+        )
+
+    @timed("similarity")
     def _similarity(
         self, word1_context: ArrayFloat, word2_context: ArrayFloat
     ) -> float:
@@ -79,24 +177,174 @@ class BaseModel(BaseEstimator):
         sim_context2 = self._similarity(word1_context2, word2_context2)
         return sim_context2 - sim_context1
 
+    @timed("similarity")
+    def _similarities(
+        self, word1_contexts: ArrayFloat, word2_contexts: ArrayFloat
+    ) -> ArrayFloat:
+        # Row-wise `_similarity` (up to floating-point summation order).
+        if self.similarity_measure == "cosine":
+            dots = einsum("ij,ij->i", word1_contexts, word2_contexts).astype(float64)
+            norms = sqrt(
+                einsum("ij,ij->i", word1_contexts, word1_contexts).astype(float64)
+                * einsum("ij,ij->i", word2_contexts, word2_contexts).astype(float64)
+            )
+            return 1.0 - clip(1.0 - dots / norms, 0.0, 2.0)
+        raise ValueError(f"Unknown similarity measure: {self.similarity_measure}")
+
+    def _changes(
+        self,
+        word1_contexts1: ArrayFloat,
+        word2_contexts1: ArrayFloat,
+        word1_contexts2: ArrayFloat,
+        word2_contexts2: ArrayFloat,
+    ) -> ArrayFloat:
+        # Row-wise `_change`, with the similarities it is computed from: (rows, 3) of
+        # sim_context1, sim_context2 and change.
+        sim_contexts1 = self._similarities(word1_contexts1, word2_contexts1)
+        sim_contexts2 = self._similarities(word1_contexts2, word2_contexts2)
+        return stack(
+            [sim_contexts1, sim_contexts2, sim_contexts2 - sim_contexts1], axis=1
+        )
+
+    def _compose_rows(
+        self, x: ArrayStr, embeddings: dict[str, ArrayFloat]
+    ) -> ArrayFloat:
+        # (4, rows, dim) composed embeddings in the order of `columns`.
+        return array(
+            [
+                [
+                    self._window_embedding(
+                        embeddings[row[context]],
+                        row[word],
+                        row[context],
+                        row[word_context],
+                    )
+                    for row in x
+                ]
+                for word, context, word_context in columns
+            ]
+        )
+
     def fit(self, _x, _y):
         """No-op."""
         return self
 
-    def predict(self, x: ArrayStr) -> ArrayFloat:
-        """Predict the change in similarity."""
+    def _predict(self, x: ArrayStr) -> tuple[ArrayFloat, dict[str, float]]:
+        timings: dict[str, float] = {}
+
+        start = perf_counter()
+        embeddings = self._context_embeddings(list(x[:, 2]) + list(x[:, 3]))
+        timings["embed"] = perf_counter() - start
+
+        start = perf_counter()
+        composed = self._compose_rows(x, embeddings)
+        timings["compose"] = perf_counter() - start
+
+        start = perf_counter()
+        similarities = self._changes(*composed)
+        timings["similarity"] = perf_counter() - start
+
+        return similarities, timings
+
+    def _memoized_predict(self, x: ArrayStr) -> tuple[ArrayFloat, dict[str, float]]:
+        # Predictions are memoized by the contents of x and the parameters.
+        x = array(x, dtype=str_)
+        key = (
+            sha256(x.tobytes()).hexdigest(),
+            x.shape,
+            *sorted(self.get_params().items()),
+        )
+
+        if key in self._memo:
+            self._memo.move_to_end(key)
+            # Nothing is computed again, so the stages take no time.
+            similarities, timings = self._memo[key]
+            return similarities, dict.fromkeys(timings, 0.0)
+
+        self._memo[key] = (
+            self._predict(x) if self._row_memo is None else self._row_predict(x)
+        )
+
+        while len(self._memo) > self.memo_size:
+            self._memo.popitem(last=False)
+
+        return self._memo[key]
+
+    def clear_cache(self) -> None:
+        """Remove every memoized prediction."""
+        self._memo.clear()
 
-        def change(row: ArrayStr) -> float:
-            return self._change(
-                self._embedding(*row[[0, 2, 4]]),
-                self._embedding(*row[[1, 2, 5]]),
-                self._embedding(*row[[0, 3, 6]]),
-                self._embedding(*row[[1, 3, 7]]),
+    def set_row_memo(self, row_memo: PredictionMemo | None) -> None:
+        """Memoize predictions row by row in `row_memo` (or not, if None)."""
+        self._row_memo = row_memo
+
+    def _row_predict(self, x: ArrayStr) -> tuple[ArrayFloat, dict[str, float]]:
+        # Only rows without a prediction in the persistent memo are predicted. The
+        # batch size doesn't change the predictions, so it isn't part of the key.
+        assert self._row_memo is not None
+
+        keys = self._row_memo.keys(
+            x,
+            {
+                "estimator": type(self).__name__,
+                **self.get_params(),
+                "batch_size": None,
+                "revision": model_revision(self.model_name),
+            },
+        )
+        memoized = self._row_memo.get(keys)
+        missing = [index for index, key in enumerate(keys) if key not in memoized]
+
+        similarities = empty((len(x), 3))
+        timings = {"embed": 0.0, "compose": 0.0, "similarity": 0.0}
+
+        if missing:
+            similarities[missing], timings = self._predict(x[missing])
+            self._row_memo.put(
+                [keys[index] for index in missing], similarities[missing]
             )
 
-        predictions = apply_along_axis(change, 1, array(x, dtype=str_))
-        return predictions
+        for index, key in enumerate(keys):
+            if key in memoized:
+                similarities[index] = memoized[key]
+
+        return similarities, timings
+
+    def predict(self, x: ArrayStr) -> ArrayFloat:
+        """Predict the change in similarity."""
+        return self._memoized_predict(x)[0][:, 2]
+
+    def predict_similarities(self, x: ArrayStr) -> ArrayFloat:
+        """Predict the similarities in each context and the change: (rows, 3)."""
+        return self._memoized_predict(x)[0]
 
     def score(self, x: ArrayStr, y: ArrayFloat):
         """Compute the Pearson correlation coefficient."""
-        return 1.0 - float(correlation(self.predict(x), y, centered=False))
+        return pearson(self.predict(x), y)
+
+    def score_subtasks(self, x: ArrayStr, y: ArrayFloat) -> dict[str, float]:
+        """
+        Compute the subtask 1 and 2 scores from the gold-standard values: (rows, 3) of
+        sim_context1, sim_context2 and change.
+        """
+
+        similarities = self.predict_similarities(x)
+        return {
+            "subtask1": pearson(similarities[:, 2], y[:, 2]),
+            **subtask2_scores(similarities, y),
+        }
+
+    def evaluate(self, x: ArrayStr, y: ArrayFloat) -> Evaluation:
+        """Predict the change in similarity and compute the Pearson correlation."""
+
+        similarities, timings = self._memoized_predict(x)
+
+        start = perf_counter()
+        score = pearson(similarities[:, 2], y)
+
+        return Evaluation(
+            similarities[:, 2],
+            score,
+            {**timings, "score": perf_counter() - start},
+            similarities,
+        )
@@ -0,0 +1,71 @@
+"""Caches shared between estimators."""
+
+from typing import NamedTuple
+
+from .utils import ArrayFloat
+
+CacheKey = tuple[str, ...]
+
+Span = tuple[int, int]
+
+
+class Encoding(NamedTuple):
+    """Token IDs and character offsets of a text."""
+
+    ids: list[int]
+    offsets: list[Span]
+
+
+class TokenCache:
+    """Encodings of contexts and spans of words in contexts, keyed by model name."""
+
+    def __init__(self):
+        self.encodings: dict[tuple[str, str], Encoding] = {}
+        self.spans: dict[tuple[str, str, str], Span] = {}
+
+    def clear(self) -> None:
+        """Remove every cached encoding and span."""
+        self.encodings.clear()
+        self.spans.clear()
+
+
+class HiddenStateCache:
+    """
+    Per-context hidden states keyed by (model name, embedding, ...) and context. The
+    hidden states do not depend on the context-window size, operation or similarity
+    measure, so one forward pass per context serves a whole sweep over them.
+    """
+
+    def __init__(self):
+        self._hidden_states: dict[tuple[CacheKey, str], ArrayFloat] = {}
+
+    def __len__(self) -> int:
+        return len(self._hidden_states)
+
+    def missing(self, key: CacheKey, contexts: list[str]) -> list[str]:
+        """Contexts without cached hidden states."""
+        return [
+            context for context in contexts if (key, context) not in self._hidden_states
+        ]
+
+    def get(self, key: CacheKey, contexts: list[str]) -> dict[str, ArrayFloat]:
+        """Cached hidden states by context."""
+        return {context: self._hidden_states[key, context] for context in contexts}
+
+    def put(
+        self, key: CacheKey, contexts: list[str], hidden_states: list[ArrayFloat]
+    ) -> None:
+        """Cache hidden states by context."""
+        for context, states in zip(contexts, hidden_states):
+            # Windows are views into the cached arrays, so protect them from writes.
+            states.setflags(write=False)
+            self._hidden_states[key, context] = states
+
+    def clear(self) -> None:
+        """Remove every cached hidden state."""
+        self._hidden_states.clear()
+
+
+hidden_state_cache = HiddenStateCache()
+
+token_cache = TokenCache()
@@ -1,49 +1,150 @@
 """Contextual-embedding models."""
 
-from transformers.modeling_outputs import BaseModelOutputWithPoolingAndCrossAttentions
+# pylint: disable=import-outside-toplevel
 
+from typing import TYPE_CHECKING
+
+from .cache import CacheKey, hidden_state_cache
 from .static import StaticBertModel
-from .utils import ArrayFloat
+from .timing import timer
+from .utils import ArrayFloat, Embedding, Precision
+
+if TYPE_CHECKING:
+    from torch import Tensor
+    from transformers import BatchEncoding
+
+
+def layer_indices(layers: str, num_layers: int) -> list[int]:
+    """
+    Indices of the hidden states to sum, where 0 is the embedding output and
+    `num_layers` is the last layer: "last", "sum-last-k", or a comma-separated list
+    (negative indices count from the end).
+    """
+
+    if layers == "last":
+        indices = [num_layers]
+    elif layers.startswith("sum-last-"):
+        count = int(layers.removeprefix("sum-last-"))
+        indices = list(range(num_layers + 1 - count, num_layers + 1))
+    else:
+        indices = [
+            int(index) + num_layers + 1 if int(index) < 0 else int(index)
+            for index in layers.split(",")
+        ]
+
+    if not indices or any(index < 0 or index > num_layers for index in indices):
+        raise ValueError(f"Unknown layers: {layers}")
+
+    return sorted(set(indices))
 
 
 class SimpleContextualBertModel(StaticBertModel):
     """BERT contextual-embedding model (outputs)."""
 
-    def _embeddings(self, context: str) -> ArrayFloat:
-        return (
-            self.model(**self.tokenizer(context, return_tensors="pt"))[0][0]
-            .detach()
-            .numpy()
+    embedding: Embedding = "contextual"
+
+    default_layers = "last"
+
+    def __init__(
+        self,
+        model_name: str,
+        context_window_size: int,
+        context_window_operation: str,
+        similarity_measure: str,
+        batch_size: int = 32,
+        precision: Precision = "fp32",
+        layers: str | None = None,
+    ):
+        super().__init__(
+            model_name,
+            context_window_size,
+            context_window_operation,
+            similarity_measure,
+            batch_size,
+            precision,
         )
+        self.layers = layers
 
-    def _embedding(self, word: str, context: str, word_context: str) -> ArrayFloat:
-        if self.context_window_operation == "none" or self.context_window_size == 0:
-            return self._embeddings(context)[self._find(word_context, context)]
+    @property
+    def _layers(self) -> str:
+        return self.default_layers if self.layers is None else self.layers
 
-        start, end = self._context_window(word, context, word_context)
-        return self._compose(self._embeddings(context)[start:end])
+    def _hidden_states(self, inputs: "BatchEncoding") -> "Tensor":
+        # Run the layers one at a time, so that only the running sum of the selected
+        # hidden states is kept and the layers above the deepest one are skipped.
+        model = self.model
+        indices = layer_indices(self._layers, model.config.num_hidden_layers)
 
+        hidden_states = model.embeddings(
+            input_ids=inputs["input_ids"], token_type_ids=inputs.get("token_type_ids")
+        )
+        if hasattr(model, "embeddings_project"):
+            hidden_states = model.embeddings_project(hidden_states)
 
-class PooledContextualBertModel(StaticBertModel):
-    """BERT contextual-embedding model (sum of last four hidden-states)."""
+        attention_mask = model.get_extended_attention_mask(
+            inputs["attention_mask"], inputs["input_ids"].shape
+        )
+
+        total = hidden_states if indices[0] == 0 else None
+
+        for index, layer in enumerate(model.encoder.layer[: indices[-1]], start=1):
+            hidden_states = layer(hidden_states, attention_mask)[0]
+            if index in indices:
+                total = hidden_states if total is None else total.add_(hidden_states)
+
+        assert total is not None
+        return total
 
     def _embeddings(self, context: str) -> ArrayFloat:
-        outputs: BaseModelOutputWithPoolingAndCrossAttentions = self.model(
-            **self.tokenizer(context, return_tensors="pt")
-        )
+        return self._batch_embeddings([context])[0]
+
+    def _batch_embeddings(self, contexts: list[str]) -> list[ArrayFloat]:
+        from torch import inference_mode
+
+        # Batch contexts of similar length together to minimise padding.
+        order = sorted(range(len(contexts)), key=lambda index: len(contexts[index]))
+
+        embeddings: list[ArrayFloat] = [None] * len(contexts)  # type: ignore
+
+        for start in range(0, len(order), self.batch_size):
+            indices = order[start : start + self.batch_size]
+
+            tokenizer = self.tokenizer
+            with timer.stage("tokenize"):
+                inputs = tokenizer(
+                    [contexts[index] for index in indices],
+                    padding=True,
+                    return_tensors="pt",
+                )
 
-        assert outputs.hidden_states is not None
+            with timer.stage("forward"), inference_mode():
+                # NumPy has no bfloat16, so reduced-precision outputs are upcast.
+                hidden_states = self._hidden_states(inputs).float().numpy()
 
-        hidden_states0 = outputs.hidden_states[-1][0].detach().numpy()
-        hidden_states1 = outputs.hidden_states[-2][0].detach().numpy()  # type: ignore
-        hidden_states2 = outputs.hidden_states[-3][0].detach().numpy()  # type: ignore
-        hidden_states3 = outputs.hidden_states[-4][0].detach().numpy()  # type: ignore
+            lengths = inputs["attention_mask"].sum(dim=1).tolist()
 
-        return hidden_states0 + hidden_states1 + hidden_states2 + hidden_states3
+            # Remove the padding so that windows are clipped as in the unbatched case.
+            for index, states, length in zip(indices, hidden_states, lengths):
+                embeddings[index] = states[:length]
+
+        return embeddings
+
+    @property
+    def _cache_key(self) -> CacheKey:
+        return (self.model_name, self.embedding, self.precision, self._layers)
+
+    def _context_embeddings(self, contexts: list[str]) -> dict[str, ArrayFloat]:
+        unique = list(dict.fromkeys(contexts))
+        missing = hidden_state_cache.missing(self._cache_key, unique)
+        hidden_state_cache.put(
+            self._cache_key, missing, self._batch_embeddings(missing)
+        )
+        return hidden_state_cache.get(self._cache_key, unique)
+
+
+class PooledContextualBertModel(SimpleContextualBertModel):
+    """BERT contextual-embedding model (sum of last four hidden-states)."""
 
-    def _embedding(self, word: str, context: str, word_context: str) -> ArrayFloat:
-        if self.context_window_operation == "none" or self.context_window_size == 0:
-            return self._embeddings(context)[self._find(word_context, context)]
+    embedding: Embedding = "pooled"
 
-        start, end = self._context_window(word, context, word_context)
-        return self._compose(self._embeddings(context)[start:end])
+    default_layers = "sum-last-4"
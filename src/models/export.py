@@ -0,0 +1,101 @@
+"""
+Exported static embeddings: the input-embedding table of a model as a memory-mapped
+array, with its tokenizer, so that static models never load the transformer.
+"""
+
+import json
+import os
+from shutil import rmtree
+
+from numpy import float32, load, save
+
+from ..data import default_languages
+from ..params import get_model_names
+from .pool import load_model, load_tokenizer, model_revision
+from .utils import ArrayFloat, Precision
+
+STATIC_DIRECTORY = "cache/static"
+
+static_tables: dict[tuple[str, Precision], ArrayFloat | None] = {}
+
+
+def export_path(model_name: str, precision: Precision = "fp32") -> str:
+    """Directory of the exported static embeddings of a model."""
+
+    return f"{STATIC_DIRECTORY}/{model_name.replace('/', '-')}_{precision}"
+
+
+def export_static(model_name: str, precision: Precision = "fp32") -> str:
+    """
+    Export the input-embedding table (vocabulary size, hidden size) and tokenizer of a
+    model. The export is written to a temporary directory and then moved into place.
+    """
+
+    path = export_path(model_name, precision)
+    temporary = f"{path}.tmp"
+    rmtree(temporary, ignore_errors=True)
+    os.makedirs(temporary)
+
+    # Load the model outside the pool, so that it is freed once exported.
+    weight = load_model(model_name, precision).get_input_embeddings().weight
+    save(f"{temporary}/embeddings.npy", weight.detach().float().numpy().astype(float32))
+    load_tokenizer(model_name).save_pretrained(temporary)
+
+    with open(f"{temporary}/index.json", "w", encoding="utf-8") as file:
+        json.dump(
+            {
+                "revision": model_revision(model_name),
+                "shape": list(weight.shape),
+            },
+            file,
+        )
+
+    rmtree(path, ignore_errors=True)
+    os.replace(temporary, path)
+
+    static_tables.pop((model_name, precision), None)
+
+    return path
+
+
+def load_static(model_name: str, precision: Precision = "fp32") -> ArrayFloat | None:
+    """Memory-map exported static embeddings, or None if missing or stale."""
+
+    path = export_path(model_name, precision)
+
+    try:
+        with open(f"{path}/index.json", encoding="utf-8") as file:
+            index = json.load(file)
+    except FileNotFoundError:
+        return None
+
+    if index["revision"] != model_revision(model_name):
+        return None
+
+    return load(f"{path}/embeddings.npy", mmap_mode="r")
+
+
+def static_table(model_name: str, precision: Precision = "fp32") -> ArrayFloat | None:
+    """Exported static embeddings, memory-mapped once per process."""
+
+    key = (model_name, precision)
+
+    if key not in static_tables:
+        static_tables[key] = load_static(model_name, precision)
+
+    return static_tables[key]
+
+
+def export_all():
+    """Export the static embeddings of every model."""
+
+    for model_name in dict.fromkeys(
+        model_name
+        for language in default_languages
+        for model_name in get_model_names(language)
+    ):
+        print(export_static(model_name))
+
+
+if __name__ == "__main__":
+    export_all()
@@ -0,0 +1,138 @@
+"""Persistent memo of the predictions of single rows."""
+
+import json
+import os
+import sqlite3
+from contextlib import closing
+from hashlib import sha256
+from time import time
+
+from numpy import array, float64
+
+from .utils import ArrayFloat, ArrayStr
+
+MEMO_PATH = "cache/memo.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS memo (
+    key TEXT PRIMARY KEY,
+    sim_context1 REAL,
+    sim_context2 REAL,
+    change REAL,
+    used REAL NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS memo_used ON memo (used);
+"""
+
+# Keys per query, below SQLite's limit on variables.
+CHUNK_SIZE = 500
+
+
+class PredictionMemo:
+    """
+    Predicted similarities of single rows (sim_context1, sim_context2 and change) in an
+    SQLite database, keyed by a hash of the row and the parameters of the estimator
+    (including the model revision). Only rows without a memoized prediction need to be
+    predicted. Beyond `max_rows` rows, the least recently used rows are evicted.
+    """
+
+    def __init__(self, path: str = MEMO_PATH, max_rows: int = 1_000_000):
+        self.path = path
+        self.max_rows = max_rows
+        self.hits = 0
+        self.misses = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=60)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.executescript(SCHEMA)
+        return connection
+
+    def keys(self, x: ArrayStr, params: dict) -> list[str]:
+        """Key of each row for an estimator's parameters."""
+
+        suffix = json.dumps(params, sort_keys=True)
+        return [
+            sha256((json.dumps(list(map(str, row))) + suffix).encode()).hexdigest()
+            for row in x
+        ]
+
+    def get(self, keys: list[str]) -> dict[str, ArrayFloat]:
+        """Memoized predictions by key, marking them as used."""
+
+        found: dict[str, ArrayFloat] = {}
+        now = time()
+
+        with closing(self._connect()) as connection:
+            with connection:
+                for start in range(0, len(keys), CHUNK_SIZE):
+                    chunk = keys[start : start + CHUNK_SIZE]
+                    placeholders = ", ".join("?" * len(chunk))
+
+                    for key, *similarities in connection.execute(
+                        "SELECT key, sim_context1, sim_context2, change FROM memo "
+                        f"WHERE key IN ({placeholders})",
+                        chunk,
+                    ):
+                        # Missing (NaN) similarities are stored as NULL.
+                        found[key] = array(similarities, dtype=float64)
+
+                    connection.execute(
+                        f"UPDATE memo SET used = ? WHERE key IN ({placeholders})",
+                        [now, *chunk],
+                    )
+
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+
+        return found
+
+    def put(self, keys: list[str], similarities: ArrayFloat) -> None:
+        """Memoize predictions: (rows, 3). Evict the least recently used rows."""
+
+        now = time()
+
+        with closing(self._connect()) as connection:
+            with connection:
+                connection.executemany(
+                    "INSERT OR REPLACE INTO memo "
+                    "(key, sim_context1, sim_context2, change, used) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (key, *map(float, row), now)
+                        for key, row in zip(keys, similarities)
+                    ],
+                )
+
+                (rows,) = connection.execute("SELECT COUNT(*) FROM memo").fetchone()
+
+                if rows > self.max_rows:
+                    connection.execute(
+                        "DELETE FROM memo WHERE key IN "
+                        "(SELECT key FROM memo ORDER BY used LIMIT ?)",
+                        (rows - self.max_rows,),
+                    )
+
+    def __len__(self) -> int:
+        with closing(self._connect()) as connection:
+            return connection.execute("SELECT COUNT(*) FROM memo").fetchone()[0]
+
+    def reset(self) -> None:
+        """Reset the hit and miss counters."""
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self) -> None:
+        """Remove every memoized prediction."""
+        with closing(self._connect()) as connection:
+            with connection:
+                connection.execute("DELETE FROM memo")
+
+    def results(self) -> dict[str, int]:
+        """Hits and misses since the last reset."""
+        return {"memo_hits": self.hits, "memo_misses": self.misses}
+
+
+prediction_memo = PredictionMemo()
@@ -0,0 +1,103 @@
+"""Peak memory of the stages of an experiment."""
+
+import os
+import resource
+import tracemalloc
+from threading import Event, Thread
+from types import TracebackType
+
+from .pool import model_pool
+
+
+def rss() -> int | None:
+    """Resident set size of the process (bytes), or None if unavailable."""
+
+    try:
+        with open("/proc/self/statm", encoding="utf-8") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def max_rss() -> int:
+    """Largest resident set size of the process so far (bytes)."""
+
+    # Linux reports kilobytes.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class MemoryTracker:
+    """
+    Peak memory while tracking is entered: the resident set size (sampled every
+    `interval` seconds by a thread), the peak of Python and NumPy allocations (traced
+    by tracemalloc, which slows down allocation), and the parameters of the loaded
+    models. tracemalloc doesn't see torch's allocator, so torch tensors only count in
+    the resident set size. Tracking is off by default, in which case entering it does
+    nothing.
+    """
+
+    def __init__(self, enabled: bool = False, interval: float = 0.01):
+        self.enabled = enabled
+        self.interval = interval
+        self.peak_rss: int | None = None
+        self.peak_python = 0
+        self._started_tracing = False
+        self._stop = Event()
+        self._thread: Thread | None = None
+
+    def _sample(self):
+        current = rss()
+        if current is not None:
+            self.peak_rss = max(self.peak_rss or 0, current)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self) -> "MemoryTracker":
+        if not self.enabled:
+            return self
+
+        self.peak_rss = None
+        self._sample()
+
+        self._started_tracing = not tracemalloc.is_tracing()
+        if self._started_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+
+        self._stop.clear()
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+        return self
+
+    def __exit__(
+        self,
+        _type: type[BaseException] | None,
+        _value: BaseException | None,
+        _traceback: TracebackType | None,
+    ) -> None:
+        if not self.enabled or self._thread is None:
+            return
+
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self._sample()
+
+        self.peak_python = tracemalloc.get_traced_memory()[1]
+        if self._started_tracing:
+            tracemalloc.stop()
+
+    def results(self) -> dict[str, int | None]:
+        """Peak memory (bytes) of the last tracked block."""
+        return {
+            "peak_rss_bytes": self.peak_rss,
+            "max_rss_bytes": max_rss(),
+            "peak_python_bytes": self.peak_python,
+            "model_bytes": model_pool.nbytes,
+        }
+
+
+memory_tracker = MemoryTracker()
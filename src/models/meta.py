@@ -2,9 +2,11 @@
 
 from sklearn.base import BaseEstimator
 
+from .base import BaseModel, Evaluation
 from .contextual import PooledContextualBertModel, SimpleContextualBertModel
+from .memo import prediction_memo
 from .static import StaticBertModel
-from .utils import Embedding
+from .utils import Embedding, Precision
 
 
 class MetaModel(BaseEstimator):
@@ -17,21 +19,45 @@ class MetaModel(BaseEstimator):
         context_window_size: int = 0,
         context_window_operation: str = "none",
         similarity_measure: str = "cosine",
+        batch_size: int = 32,
+        precision: Precision = "fp32",
+        layers: str | None = None,
+        memo: bool = False,
     ):
         self.model = model
         self.model_name = model_name
         self.context_window_size = context_window_size
         self.context_window_operation = context_window_operation
         self.similarity_measure = similarity_measure
+        self.batch_size = batch_size
+        self.precision = precision
+        self.layers = layers
+        self.memo = memo
+        self._estimator_params: tuple | None = None
+        self._estimator_instance: BaseModel | None = None
 
     @property
-    def _estimator(self):
+    def _estimator(self) -> BaseModel:
+        # Keep the estimator (and its prediction memo) until the parameters change. With
+        # `memo`, predictions are also memoized row by row on disk.
+        params = tuple(sorted(self.get_params().items()))
+        if self._estimator_instance is None or self._estimator_params != params:
+            self._estimator_params = params
+            self._estimator_instance = self._build_estimator()
+            if self.memo:
+                self._estimator_instance.set_row_memo(prediction_memo)
+        return self._estimator_instance
+
+    def _build_estimator(self) -> BaseModel:
         if self.model == "contextual":
             return SimpleContextualBertModel(
                 self.model_name,
                 self.context_window_size,
                 self.context_window_operation,
                 self.similarity_measure,
+                self.batch_size,
+                self.precision,
+                self.layers,
             )
         if self.model == "pooled":
             return PooledContextualBertModel(
@@ -39,6 +65,9 @@ class MetaModel(BaseEstimator):
                 self.context_window_size,
                 self.context_window_operation,
                 self.similarity_measure,
+                self.batch_size,
+                self.precision,
+                self.layers,
             )
         if self.model == "static":
             return StaticBertModel(
@@ -46,9 +75,15 @@ class MetaModel(BaseEstimator):
                 self.context_window_size,
                 self.context_window_operation,
                 self.similarity_measure,
+                self.batch_size,
+                self.precision,
             )
         raise ValueError(f"Unknown model: {self.model}")
 
+    def clear_cache(self) -> None:
+        """Remove every memoized prediction."""
+        self._estimator.clear_cache()
+
     def fit(self, x, y):
         """Fit the model."""
         return self._estimator.fit(x, y)
@@ -60,3 +95,15 @@ class MetaModel(BaseEstimator):
     def score(self, x, y):
         """Compute the Pearson correlation coefficient."""
         return self._estimator.score(x, y)
+
+    def predict_similarities(self, x):
+        """Predict the similarities in each context and the change."""
+        return self._estimator.predict_similarities(x)
+
+    def score_subtasks(self, x, y):
+        """Compute the subtask 1 and 2 scores."""
+        return self._estimator.score_subtasks(x, y)
+
+    def evaluate(self, x, y) -> Evaluation:
+        """Predict the change in similarity and compute the Pearson correlation."""
+        return self._estimator.evaluate(x, y)
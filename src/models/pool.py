@@ -0,0 +1,174 @@
+"""Process-wide pool of loaded models and tokenizers."""
+
+# pylint: disable=import-outside-toplevel
+
+import os
+from collections import OrderedDict
+from functools import lru_cache
+from hashlib import sha256
+from typing import TYPE_CHECKING
+
+from .timing import timed
+from .utils import Precision
+
+if TYPE_CHECKING:
+    from transformers import PretrainedConfig, PreTrainedModel, PreTrainedTokenizerFast
+
+# torch and transformers are imported when a model is first loaded, so that scripts
+# that don't load models start quickly.
+
+electra_model_names = ["classla/bcms-bertic"]
+
+ModelKey = tuple[str, Precision]
+
+
+def load_config(model_name: str, **kwargs) -> "PretrainedConfig":
+    """Load a pre-trained model configuration."""
+
+    from transformers import BertConfig, ElectraConfig
+
+    if model_name in electra_model_names:
+        return ElectraConfig.from_pretrained(model_name, **kwargs)
+
+    return BertConfig.from_pretrained(model_name, **kwargs)
+
+
+@timed("load")
+def load_model(model_name: str, precision: Precision = "fp32") -> "PreTrainedModel":
+    """
+    Load a pre-trained model in full precision (fp32), in bfloat16 (bf16), or with its
+    linear layers dynamically quantized to 8-bit integers (int8).
+    """
+
+    from torch import bfloat16
+    from torch.ao.quantization import quantize_dynamic
+    from torch.nn import Linear
+    from transformers import BertModel, ElectraModel
+
+    config = load_config(model_name)
+
+    if model_name in electra_model_names:
+        model = ElectraModel.from_pretrained(model_name, config=config)
+    else:
+        model = BertModel.from_pretrained(model_name, config=config)
+
+    if precision == "bf16":
+        return model.to(bfloat16)  # type: ignore
+    if precision == "int8":
+        return quantize_dynamic(model, {Linear})  # type: ignore
+    if precision == "fp32":
+        return model  # type: ignore
+
+    raise ValueError(f"Unknown precision: {precision}")
+
+
+@lru_cache
+def model_revision(model_name: str) -> str:
+    """
+    Revision of a pre-trained model, without loading the weights: the commit hash of a
+    model from the hub or, as a local directory has none, a hash of the names, sizes and
+    modification times of its files (the weights, configuration and tokenizer).
+    """
+
+    if os.path.isdir(model_name):
+        digest = sha256()
+        for name in sorted(os.listdir(model_name)):
+            path = os.path.join(model_name, name)
+            if os.path.isfile(path):
+                stat = os.stat(path)
+                digest.update(f"{name} {stat.st_size} {stat.st_mtime_ns}\n".encode())
+        return digest.hexdigest()
+
+    return str(getattr(load_config(model_name), "_commit_hash", None))
+
+
+@timed("load")
+def load_tokenizer(
+    model_name: str, path: str | None = None
+) -> "PreTrainedTokenizerFast":
+    """Load a pre-trained (fast) tokenizer, from `path` (e.g. an export) if given."""
+
+    from transformers import BertTokenizerFast, ElectraTokenizerFast
+
+    if model_name in electra_model_names:
+        return ElectraTokenizerFast.from_pretrained(path or model_name)
+
+    return BertTokenizerFast.from_pretrained(path or model_name)
+
+
+def model_nbytes(model: "PreTrainedModel") -> int:
+    """Memory used by the parameters and buffers of a model."""
+
+    from torch.ao.nn.quantized.dynamic import Linear as QuantizedLinear
+
+    tensors = [*model.parameters(), *model.buffers()]
+
+    # Quantized weights are packed, not parameters.
+    for module in model.modules():
+        if isinstance(module, QuantizedLinear):
+            tensors.extend(
+                tensor
+                for tensor in [module.weight(), module.bias()]
+                if tensor is not None
+            )
+
+    return sum(tensor.numel() * tensor.element_size() for tensor in tensors)
+
+
+class ModelPool:
+    """
+    Models keyed by model name and precision and tokenizers keyed by model name, shared
+    by every estimator in the process. When the models exceed `max_bytes`, the
+    least-recently-used models are evicted (the most recent model is always kept).
+    Tokenizers are small and are never evicted.
+    """
+
+    def __init__(self, max_bytes: int | None = None):
+        self.max_bytes = max_bytes
+        self._models: OrderedDict[ModelKey, PreTrainedModel] = OrderedDict()
+        self._tokenizers: dict[str, PreTrainedTokenizerFast] = {}
+
+    def model(
+        self, model_name: str, precision: Precision = "fp32"
+    ) -> "PreTrainedModel":
+        """Get a model, loading it if necessary."""
+
+        key = (model_name, precision)
+
+        if key in self._models:
+            self._models.move_to_end(key)
+        else:
+            self._models[key] = load_model(model_name, precision)
+            self._evict()
+
+        return self._models[key]
+
+    def tokenizer(
+        self, model_name: str, path: str | None = None
+    ) -> "PreTrainedTokenizerFast":
+        """Get a tokenizer, loading it (from `path` if given) if necessary."""
+
+        if model_name not in self._tokenizers:
+            self._tokenizers[model_name] = load_tokenizer(model_name, path)
+
+        return self._tokenizers[model_name]
+
+    @property
+    def nbytes(self) -> int:
+        """Memory used by the loaded models."""
+        return sum(model_nbytes(model) for model in self._models.values())
+
+    def _evict(self):
+        if self.max_bytes is None:
+            return
+
+        while len(self._models) > 1 and self.nbytes > self.max_bytes:
+            self._models.popitem(last=False)
+
+    def clear(self):
+        """Unload every model and tokenizer."""
+        self._models.clear()
+        self._tokenizers.clear()
+
+
+model_pool = ModelPool()
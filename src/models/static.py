@@ -1,82 +1,136 @@
 """Static-embedding model."""
 
-from transformers import (
-    BertConfig,
-    BertModel,
-    BertTokenizer,
-    ElectraConfig,
-    ElectraModel,
-    ElectraTokenizer,
-    PreTrainedModel,
-    PreTrainedTokenizer,
-)
+from typing import TYPE_CHECKING
 
 from .base import BaseModel
-from .utils import ArrayFloat
+from .cache import Encoding, Span, token_cache
+from .export import export_path, static_table
+from .pool import model_pool
+from .timing import timed, timer
+from .utils import ArrayFloat, Embedding, Precision
+
+if TYPE_CHECKING:
+    from transformers import PreTrainedModel, PreTrainedTokenizerFast
 
 
 class StaticBertModel(BaseModel):
     """BERT static-embedding model."""
 
+    embedding: Embedding = "static"
+
     def __init__(
         self,
         model_name: str,
         context_window_size: int,
         context_window_operation: str,
         similarity_measure: str,
+        batch_size: int = 32,
+        precision: Precision = "fp32",
     ):
         super().__init__(
             model_name,
             context_window_size,
             context_window_operation,
             similarity_measure,
+            batch_size,
         )
+        self.precision = precision
+        self._table: ArrayFloat | None = None
 
-        self.model: PreTrainedModel
-        self.tokenizer: PreTrainedTokenizer
-        self._set_model()
-
-    def set_params(self, **params) -> None:
-        super().set_params(**params)
-        self._set_model()
-
-    def _set_model(self):
-        if self.model_name in ["classla/bcms-bertic"]:
-            self.model = ElectraModel.from_pretrained(
-                self.model_name,
-                config=ElectraConfig.from_pretrained(
-                    self.model_name, output_hidden_states=True
-                ),
-            )  # type: ignore
-            self.tokenizer = ElectraTokenizer.from_pretrained(self.model_name)
-
-        else:
-            self.model = BertModel.from_pretrained(
-                self.model_name,
-                config=BertConfig.from_pretrained(
-                    self.model_name, output_hidden_states=True
-                ),
-            )  # type: ignore
-            self.tokenizer = BertTokenizer.from_pretrained(self.model_name)
+    @property
+    def model(self) -> "PreTrainedModel":
+        """Pre-trained model (shared via the model pool)."""
+        return model_pool.model(self.model_name, self.precision)
+
+    @property
+    def tokenizer(self) -> "PreTrainedTokenizerFast":
+        """
+        Pre-trained tokenizer (shared via the model pool), read from the export if the
+        static embeddings are exported.
+        """
+
+        if static_table(self.model_name, self.precision) is not None:
+            return model_pool.tokenizer(
+                self.model_name, export_path(self.model_name, self.precision)
+            )
+
+        return model_pool.tokenizer(self.model_name)
+
+    def _encoding(self, context: str) -> Encoding:
+        key = (self.model_name, context)
+
+        if key not in token_cache.encodings:
+            tokenizer = self.tokenizer
+            with timer.stage("tokenize"):
+                encoding = tokenizer(
+                    context, add_special_tokens=False, return_offsets_mapping=True
+                )
+            token_cache.encodings[key] = Encoding(
+                encoding["input_ids"], encoding["offset_mapping"]
+            )
+
+        return token_cache.encodings[key]
 
     def _encode(self, text):
+        if isinstance(text, str):
+            return self._encoding(text).ids
         return self.tokenizer.encode(text, add_special_tokens=False)
 
+    def _span(self, word: str, context: str) -> Span:
+        key = (self.model_name, context, word)
+
+        if key not in token_cache.spans:
+            token_cache.spans[key] = self._locate(word, context)
+
+        return token_cache.spans[key]
+
+    def _locate(self, word: str, context: str) -> Span:
+        offsets = self._encoding(context).offsets
+
+        starts: dict[int, int] = {}
+        ends: set[int] = set()
+        for index, (start, end) in enumerate(offsets):
+            starts.setdefault(start, index)
+            ends.add(end)
+
+        # The first occurrence of the word that is a whole word in the context and ends
+        # on a token boundary.
+        position = context.find(word)
+        while position != -1:
+            stop = position + len(word)
+            if (
+                position in starts
+                and stop in ends
+                and (position == 0 or not context[position - 1].isalnum())
+                and (stop == len(context) or not context[stop].isalnum())
+            ):
+                start = starts[position]
+                end = start
+                while end < len(offsets) and offsets[end][0] < stop:
+                    end += 1
+                return start, end
+            position = context.find(word, position + 1)
+
+        # Otherwise, e.g. if normalisation changes the word, search for its subwords.
+        return super()._span(word, context)
+
     def _decode(self, tokens):
         return self.tokenizer.decode(tokens)
 
     @property
     def _static_embeddings(self) -> ArrayFloat:
-        return self.model.get_input_embeddings().weight.detach().numpy()
-
-    def _embeddings(self, _context: str) -> ArrayFloat:
-        return self._static_embeddings
-
-    def _embedding(self, word: str, context: str, word_context: str) -> ArrayFloat:
-        tokens = self._encode(context)
-
-        if self.context_window_operation == "none" or self.context_window_size == 0:
-            return self._static_embeddings[tokens[self._find(word_context, context)]]
-
-        start, end = self._context_window(word, context, word_context)
-        return self._compose(self._embeddings(context)[tokens[start:end]])
+        # Exported embeddings are memory-mapped, so the transformer is never loaded and
+        # only the rows that are indexed are read. Otherwise, the table is converted
+        # (e.g. from bf16) once per estimator, not once per context.
+        if self._table is None:
+            table = static_table(self.model_name, self.precision)
+            if table is None:
+                table = (
+                    self.model.get_input_embeddings().weight.detach().float().numpy()
+                )
+            self._table = table
+        return self._table
+
+    @timed("forward")
+    def _embeddings(self, context: str) -> ArrayFloat:
+        return self._static_embeddings[self._encode(context)]
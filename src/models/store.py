@@ -0,0 +1,111 @@
+"""Persistent, memory-mapped store of contextual hidden states."""
+
+import json
+import os
+from shutil import rmtree
+
+from numpy import concatenate, cumsum, float32, load, save
+
+from ..data import data_hash
+from .cache import hidden_state_cache
+from .contextual import SimpleContextualBertModel
+from .pool import model_revision
+from .utils import ArrayFloat
+
+STORE_DIRECTORY = "cache/embeddings"
+
+
+def store_path(estimator: SimpleContextualBertModel, language: str, practice: bool):
+    """Directory of the stored hidden states for a model and dataset."""
+
+    prefix = "practice" if practice else "evaluation"
+    key = "_".join(estimator._cache_key)  # pylint: disable=protected-access
+    return f"{STORE_DIRECTORY}/{prefix}_{language}/{key.replace('/', '-')}"
+
+
+def fingerprint(model_name: str, language: str, practice: bool) -> dict[str, str]:
+    """Dataset contents and model revision that the stored hidden states depend on."""
+
+    return {
+        "data": data_hash(language, practice),
+        "revision": model_revision(model_name),
+    }
+
+
+def save_store(
+    path: str,
+    contexts: list[str],
+    hidden_states: list[ArrayFloat],
+    store_fingerprint: dict[str, str],
+) -> None:
+    """
+    Save hidden states as a flat (tokens, hidden size) array, with the offset of each
+    context's first token and an index of contexts. The store is written to a
+    temporary directory and then moved into place, so a crash never leaves a partial
+    store behind.
+    """
+
+    temporary = f"{path}.tmp"
+    rmtree(temporary, ignore_errors=True)
+    os.makedirs(temporary)
+
+    lengths = [len(states) for states in hidden_states]
+
+    save(f"{temporary}/hidden_states.npy", concatenate(hidden_states).astype(float32))
+    save(f"{temporary}/offsets.npy", cumsum([0] + lengths))
+
+    with open(f"{temporary}/index.json", "w", encoding="utf-8") as file:
+        json.dump({"fingerprint": store_fingerprint, "contexts": contexts}, file)
+
+    rmtree(path, ignore_errors=True)
+    os.replace(temporary, path)
+
+
+def load_store(
+    path: str, store_fingerprint: dict[str, str]
+) -> dict[str, ArrayFloat] | None:
+    """Memory-map stored hidden states by context, or None if missing or stale."""
+
+    try:
+        with open(f"{path}/index.json", encoding="utf-8") as file:
+            stored_index = json.load(file)
+    except FileNotFoundError:
+        return None
+
+    if stored_index["fingerprint"] != store_fingerprint:
+        return None
+
+    hidden_states = load(f"{path}/hidden_states.npy", mmap_mode="r")
+    offsets = load(f"{path}/offsets.npy")
+
+    return {
+        context: hidden_states[offsets[index] : offsets[index + 1]]
+        for index, context in enumerate(stored_index["contexts"])
+    }
+
+
+def prime(
+    estimator: SimpleContextualBertModel,
+    contexts: list[str],
+    language: str,
+    practice: bool = False,
+) -> None:
+    """
+    Fill the hidden-state cache for a dataset from the store. If the store is missing
+    or stale, run the model over every context and write the store first.
+    """
+
+    path = store_path(estimator, language, practice)
+    store_fingerprint = fingerprint(estimator.model_name, language, practice)
+
+    stored = load_store(path, store_fingerprint)
+
+    if stored is None:
+        unique = list(dict.fromkeys(contexts))
+        # pylint: disable-next=protected-access
+        save_store(path, unique, estimator._batch_embeddings(unique), store_fingerprint)
+        stored = load_store(path, store_fingerprint)
+        assert stored is not None
+
+    # pylint: disable-next=protected-access
+    hidden_state_cache.put(estimator._cache_key, list(stored), list(stored.values()))
@@ -0,0 +1,215 @@
+"""
+Window sweeps: compose embeddings and compute similarities for every context-window
+size in one pass, instead of recomposing from scratch for each size.
+"""
+
+# pylint: disable=protected-access
+
+from numpy import (
+    asarray,
+    clip,
+    concatenate,
+    cumsum,
+    einsum,
+    empty,
+    float64,
+    maximum,
+    minimum,
+    repeat,
+    sqrt,
+    stack,
+    str_,
+    trace,
+    zeros,
+)
+from pandas import DataFrame
+from scipy.spatial.distance import correlation
+
+from .base import BaseModel, columns
+from .utils import ArrayFloat, ArrayStr
+
+
+def window_bounds(index: int, length: int, windows: list[int]):
+    """Start and end of the context window around a token for each window size."""
+
+    sizes = asarray(windows)
+    return maximum(index - sizes, 0), minimum(index + sizes + 1, length)
+
+
+def sweep_vectors(
+    embeddings: ArrayFloat, index: int, windows: list[int], operation: str
+) -> ArrayFloat:
+    """
+    (windows, dim) composed embeddings of a token for each window size: cumulative sums
+    for sum and mean, incremental products for prod.
+    """
+
+    starts, ends = window_bounds(index, len(embeddings), windows)
+
+    if operation == "none":
+        return repeat(embeddings[index][None].astype(float64), len(windows), axis=0)
+
+    if operation in ["sum", "mean"]:
+        prefix = concatenate(
+            [zeros((1, embeddings.shape[1])), cumsum(embeddings, axis=0, dtype=float64)]
+        )
+        sums = prefix[ends] - prefix[starts]
+        if operation == "sum":
+            return sums
+        return sums / (ends - starts)[:, None]
+
+    if operation == "prod":
+        # Each product is taken as by `_compose`, in the dtype and order of the
+        # embeddings: long float32 products underflow, so an incremental or float64
+        # product gives other scores.
+        return stack(
+            [embeddings[start:end].prod(axis=0) for start, end in zip(starts, ends)]
+        )
+
+    raise ValueError(f"Unknown context window operation: {operation}")
+
+
+def cosine_similarities(vectors1: ArrayFloat, vectors2: ArrayFloat) -> ArrayFloat:
+    """Row-wise cosine similarities, computed as by `BaseModel._similarities`."""
+
+    dots = einsum("ij,ij->i", vectors1, vectors2).astype(float64)
+    norms = sqrt(
+        einsum("ij,ij->i", vectors1, vectors1).astype(float64)
+        * einsum("ij,ij->i", vectors2, vectors2).astype(float64)
+    )
+    return 1.0 - clip(1.0 - dots / norms, 0.0, 2.0)
+
+
+def concat_similarities(
+    embeddings1: ArrayFloat,
+    index1: int,
+    embeddings2: ArrayFloat,
+    index2: int,
+    windows: list[int],
+) -> ArrayFloat:
+    """
+    Cosine similarities of concatenated context windows for each window size, from the
+    per-position dot products and squared norms (without building the concatenations).
+    """
+
+    starts1, ends1 = window_bounds(index1, len(embeddings1), windows)
+    starts2, ends2 = window_bounds(index2, len(embeddings2), windows)
+
+    # Only positions within the largest window are needed.
+    start1, end1 = starts1.min(), ends1.max()
+    start2, end2 = starts2.min(), ends2.max()
+    dots = embeddings1[start1:end1].astype(float64) @ embeddings2[start2:end2].T
+
+    squared_norms1 = concatenate(
+        [[0.0], cumsum(einsum("ij,ij->i", embeddings1, embeddings1, dtype=float64))]
+    )
+    squared_norms2 = concatenate(
+        [[0.0], cumsum(einsum("ij,ij->i", embeddings2, embeddings2, dtype=float64))]
+    )
+
+    similarities = empty(len(windows))
+
+    for position, (window_start1, window_end1, window_start2, window_end2) in enumerate(
+        zip(starts1, ends1, starts2, ends2)
+    ):
+        # Concatenations are zero-padded at the end, so position k of one window lines
+        # up with position k of the other.
+        length = min(window_end1 - window_start1, window_end2 - window_start2)
+        dot = trace(
+            dots[
+                window_start1 - start1 : window_start1 - start1 + length,
+                window_start2 - start2 : window_start2 - start2 + length,
+            ]
+        )
+        norm = sqrt(
+            (squared_norms1[window_end1] - squared_norms1[window_start1])
+            * (squared_norms2[window_end2] - squared_norms2[window_start2])
+        )
+        similarities[position] = 1.0 - clip(1.0 - dot / norm, 0.0, 2.0)
+
+    return similarities
+
+
+def sweep_similarities(
+    embeddings1: ArrayFloat,
+    index1: int,
+    embeddings2: ArrayFloat,
+    index2: int,
+    windows: list[int],
+    operation: str,
+) -> ArrayFloat:
+    """Cosine similarities of two tokens for each window size."""
+
+    if operation == "concat":
+        return concat_similarities(embeddings1, index1, embeddings2, index2, windows)
+
+    return cosine_similarities(
+        sweep_vectors(embeddings1, index1, windows, operation),
+        sweep_vectors(embeddings2, index2, windows, operation),
+    )
+
+
+def sweep_scores(
+    estimator: BaseModel,
+    x: ArrayStr,
+    y: ArrayFloat,
+    windows: list[int],
+    operations: list[str],
+) -> DataFrame:
+    """
+    Pearson correlation coefficient of an estimator for every window size and
+    operation, from one pass over the data. The estimator's own window size and
+    operation are ignored.
+    """
+
+    if estimator.similarity_measure != "cosine":
+        raise ValueError(f"Unknown similarity measure: {estimator.similarity_measure}")
+
+    x = asarray(x, dtype=str_)
+
+    embeddings = estimator._context_embeddings(list(x[:, 2]) + list(x[:, 3]))
+
+    # (operations, windows, rows)
+    changes = empty((len(operations), len(windows), len(x)))
+
+    for row_index, row in enumerate(x):
+        indices = [
+            estimator._find(row[word_context], row[context])
+            for _word, context, word_context in columns
+        ]
+
+        for operation_index, operation in enumerate(operations):
+            sim_context1 = sweep_similarities(
+                embeddings[row[2]],
+                indices[0],
+                embeddings[row[2]],
+                indices[1],
+                windows,
+                operation,
+            )
+            sim_context2 = sweep_similarities(
+                embeddings[row[3]],
+                indices[2],
+                embeddings[row[3]],
+                indices[3],
+                windows,
+                operation,
+            )
+            changes[operation_index, :, row_index] = sim_context2 - sim_context1
+
+    return DataFrame(
+        [
+            {
+                "window": window,
+                "operation": operation,
+                "score": 1.0
+                - float(
+                    correlation(
+                        changes[operation_index, window_index], y, centered=False
+                    )
+                ),
+            }
+            for operation_index, operation in enumerate(operations)
+            for window_index, window in enumerate(windows)
+        ]
+    )
@@ -0,0 +1,75 @@
+"""Cumulative wall time and call counts of the stages of prediction."""
+
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import wraps
+from time import perf_counter
+from typing import Callable, Iterator, TypeVar
+
+stages = ["load", "tokenize", "find", "forward", "compose", "similarity"]
+
+Function = TypeVar("Function", bound=Callable)
+
+
+class Timer:
+    """
+    Cumulative wall time and call counts by stage. Timing is off by default, and costs
+    one attribute check per call when off. Stages can nest, e.g. `find` includes any
+    tokenization that it triggers.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.times: defaultdict[str, float] = defaultdict(float)
+        self.calls: defaultdict[str, int] = defaultdict(int)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Time a block as one call of a stage."""
+
+        if not self.enabled:
+            yield
+            return
+
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.times[name] += perf_counter() - start
+            self.calls[name] += 1
+
+    def reset(self) -> None:
+        """Remove every time and call count."""
+        self.times.clear()
+        self.calls.clear()
+
+    def results(self) -> dict[str, float]:
+        """Time (seconds) and call count of every stage."""
+        return {
+            **{f"time_{name}": self.times[name] for name in stages},
+            **{f"calls_{name}": self.calls[name] for name in stages},
+        }
+
+
+timer = Timer()
+
+
+def timed(name: str) -> Callable[[Function], Function]:
+    """Time every call of a function as a stage."""
+
+    def decorator(function: Function) -> Function:
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not timer.enabled:
+                return function(*args, **kwargs)
+
+            start = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                timer.times[name] += perf_counter() - start
+                timer.calls[name] += 1
+
+        return wrapper  # type: ignore
+
+    return decorator
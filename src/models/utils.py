@@ -12,6 +12,10 @@ Embedding = Literal["static", "contextual", "pooled"]
 
 embeddings: list[Embedding] = ["static", "contextual", "pooled"]
 
+Precision = Literal["fp32", "bf16", "int8"]
+
+precisions: list[Precision] = ["fp32", "bf16", "int8"]
+
 
 def padflat(embeddings: ndarray, window: int, dim: int) -> ndarray:
     """Flatten (n, d) embeddings and pad to (n * d,) where n = 2 * window + 1."""
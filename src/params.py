@@ -5,6 +5,10 @@ from typing import NamedTuple
 from .data import Language
 from .models.utils import Embedding
 
+operations = ["none", "sum", "mean", "prod", "concat"]
+
+similarity_measures = ["cosine"]
+
 model_names_multilingual = [
     "bert-base-multilingual-cased",
     "bert-base-multilingual-uncased",
@@ -0,0 +1,119 @@
+"""
+A script to compare the speed and accuracy of each inference precision against full
+precision (fp32), for the best parameters of each language and embedding.
+"""
+
+# pylint: disable=protected-access
+
+from os import makedirs
+from time import perf_counter
+
+from numpy import abs as absolute
+from pandas import DataFrame
+
+from .compiled import load_compiled
+from .models.cache import hidden_state_cache
+from .models.meta import MetaModel
+from .models.pool import model_nbytes, model_pool
+from .models.utils import precisions
+from .params import Params
+from .params_best import (
+    en_contextual,
+    en_pooled,
+    en_static,
+    fi_contextual,
+    fi_pooled,
+    fi_static,
+    hr_contextual,
+    hr_pooled,
+    hr_static,
+    sl_contextual,
+    sl_pooled,
+    sl_static,
+)
+
+PRECISION_DIRECTORY = "results/precision"
+
+
+def compare_precisions(params: Params, practice: bool = False) -> list[dict]:
+    """Time and score the predictions of each precision."""
+
+    x, y = load_compiled(params.model_name, params.language, practice)
+    y = y[:, 2]
+
+    results = []
+    baseline = None
+
+    for precision in precisions:
+        # Don't time loading (or quantizing) the model, or reuse another precision's
+        # hidden states.
+        model_pool.clear()
+        hidden_state_cache.clear()
+
+        model = MetaModel(
+            params.embedding,
+            params.model_name,
+            params.window,
+            params.operation,
+            params.similarity,
+            precision=precision,
+        )
+        estimator = model._estimator
+        nbytes = model_nbytes(estimator.model)
+
+        start = perf_counter()
+        evaluation = model.evaluate(x, y)
+        time = perf_counter() - start
+
+        if baseline is None:
+            baseline = evaluation, time
+
+        results.append(
+            {
+                **params.to_dict(),
+                "precision": precision,
+                "score": evaluation.score,
+                "time": time,
+                "model_bytes": nbytes,
+                "speedup": baseline[1] / time,
+                "score_difference": evaluation.score - baseline[0].score,
+                "max_prediction_difference": float(
+                    absolute(evaluation.predictions - baseline[0].predictions).max()
+                ),
+            }
+        )
+
+        print(results[-1])
+
+    return results
+
+
+def save_precision_results():
+    """Save the comparison of inference precisions."""
+
+    results = []
+
+    for params in [
+        en_static,
+        en_contextual,
+        en_pooled,
+        fi_static,
+        fi_contextual,
+        fi_pooled,
+        hr_static,
+        hr_contextual,
+        hr_pooled,
+        sl_static,
+        sl_contextual,
+        sl_pooled,
+    ]:
+        results.extend(compare_precisions(params))
+
+        makedirs(PRECISION_DIRECTORY, exist_ok=True)
+        DataFrame(results).to_csv(
+            f"{PRECISION_DIRECTORY}/precision_results.csv", index=False
+        )
+
+
+if __name__ == "__main__":
+    save_precision_results()
@@ -0,0 +1,167 @@
+"""
+A script to predict the similarities of word pairs in a TSV or JSONL file of any size,
+in chunks, writing the predictions as it goes.
+"""
+
+import json
+from argparse import ArgumentParser
+from itertools import islice
+from time import perf_counter
+from typing import Iterator
+
+from numpy import full, nan, str_
+from pandas import DataFrame, read_csv
+
+from .args import add_model_arguments
+from .data import remove_strong_tags
+from .models.cache import hidden_state_cache, token_cache
+from .models.meta import MetaModel
+from .models.utils import ArrayFloat, ArrayStr
+
+input_columns = [
+    "word1",
+    "word2",
+    "context1",
+    "context2",
+    "word1_context1",
+    "word2_context1",
+    "word1_context2",
+    "word2_context2",
+]
+
+
+def read_chunks(path: str, chunk_size: int) -> Iterator[DataFrame]:
+    """Read a TSV or JSONL file of word pairs in chunks."""
+
+    if path.endswith(".jsonl"):
+        with open(path, encoding="utf-8") as file:
+            while lines := list(islice(file, chunk_size)):
+                yield DataFrame([json.loads(line) for line in lines if line.strip()])
+        return
+
+    yield from read_csv(path, sep="\t", chunksize=chunk_size)
+
+
+def write_chunk(path: str, predictions: DataFrame, first: bool) -> None:
+    """Write (or append) a chunk of predictions to a TSV or JSONL file."""
+
+    mode = "w" if first else "a"
+
+    if path.endswith(".jsonl"):
+        predictions.to_json(path, orient="records", lines=True, mode=mode)
+        return
+
+    predictions.to_csv(path, sep="\t", index=False, header=first, mode=mode)
+
+
+def predict_rows(model: MetaModel, x: ArrayStr, first_row: int = 0) -> ArrayFloat:
+    """
+    Predict the similarities in each context and the change: (rows, 3). If the chunk
+    fails, e.g. because a target word is missing from its context, its rows are
+    predicted one by one and the failing rows get NaN.
+    """
+
+    try:
+        return model.predict_similarities(x)
+    # pylint: disable=broad-exception-caught
+    except Exception:
+        pass
+
+    similarities = full((len(x), 3), nan)
+
+    for index in range(len(x)):
+        try:
+            similarities[index] = model.predict_similarities(x[index : index + 1])
+        # pylint: disable=broad-exception-caught
+        except Exception as exception:
+            print(f"row {first_row + index}: {exception}")
+
+    return similarities
+
+
+def predict_file(
+    model: MetaModel, input_path: str, output_path: str, chunk_size: int = 1024
+) -> int:
+    """
+    Predict the similarities in each context and the change for every row of a file.
+    Only one chunk of rows, hidden states and predictions is held in memory at a time.
+    Rows that can't be predicted get NaN.
+    """
+
+    rows = 0
+    start = perf_counter()
+
+    for index, chunk in enumerate(read_chunks(input_path, chunk_size)):
+        chunk = chunk[input_columns].astype(str)
+        chunk["context1"] = chunk["context1"].apply(remove_strong_tags)
+        chunk["context2"] = chunk["context2"].apply(remove_strong_tags)
+
+        similarities = predict_rows(model, chunk.to_numpy().astype(str_), rows)
+
+        write_chunk(
+            output_path,
+            DataFrame(
+                {
+                    "predicted": similarities[:, 2],
+                    "predicted_sim_context1": similarities[:, 0],
+                    "predicted_sim_context2": similarities[:, 1],
+                }
+            ),
+            index == 0,
+        )
+
+        # Contexts rarely repeat across chunks, so don't let the caches grow.
+        hidden_state_cache.clear()
+        token_cache.clear()
+        model.clear_cache()
+
+        rows += len(chunk)
+        time = perf_counter() - start
+        print(f"rows = {rows}, time = {time:.3f} s, rows/s = {rows / time:.1f}")
+
+    return rows
+
+
+def predict():
+    """Predict the similarities in a file."""
+
+    parser = ArgumentParser()
+
+    parser.add_argument("input", help="TSV or JSONL file of word pairs")
+    parser.add_argument("output", help="TSV or JSONL file of predictions")
+
+    add_model_arguments(parser)
+
+    parser.add_argument(
+        "-c",
+        "--chunk-size",
+        type=int,
+        default=1024,
+        help="rows per chunk",
+    )
+
+    parser.add_argument(
+        "--memo",
+        action="store_true",
+        help="memoize predictions row by row on disk, so only new rows are predicted",
+    )
+
+    args = parser.parse_args()
+
+    model = MetaModel(
+        args.embedding,
+        args.model_name,
+        args.window,
+        args.operation,
+        args.similarity,
+        args.batch_size,
+        args.precision,
+        args.layers,
+        args.memo,
+    )
+
+    predict_file(model, args.input, args.output, args.chunk_size)
+
+
+if __name__ == "__main__":
+    predict()
@@ -0,0 +1,395 @@
+"""
+The results store: every experiment result, with its metrics and predictions, in one
+SQLite database. Appends are safe from concurrent processes (write-ahead logging), and
+results are indexed by language, embedding, model name, window and operation.
+"""
+
+import json
+import os
+import re
+import sqlite3
+from contextlib import closing
+from math import isnan
+from typing import Literal
+
+from pandas import DataFrame, read_csv, read_sql_query
+
+from .params import Params
+
+RESULTS_PATH = "results/results.sqlite"
+
+Kit = Literal["evaluation", "practice"]
+
+kits: list[Kit] = ["evaluation", "practice"]
+
+columns = [
+    "embedding",
+    "model_name",
+    "language",
+    "window",
+    "operation",
+    "similarity",
+    "score",
+    "time",
+]
+
+prediction_columns = [
+    "predicted",
+    "actual",
+    "predicted_sim_context1",
+    "predicted_sim_context2",
+]
+
+filter_columns = columns[:6] + ["precision", "layers", "source"]
+
+# `window` is an SQL keyword, so the columns are quoted.
+SELECT_COLUMNS = ", ".join(f'"{name}"' for name in columns)
+
+# Results of the same configuration supersede each other.
+CONFIGURATION = ", ".join(
+    f'"{name}"' for name in ["kit", *columns[:6], "precision", "layers"]
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    kit TEXT NOT NULL,
+    embedding TEXT NOT NULL,
+    model_name TEXT NOT NULL,
+    language TEXT NOT NULL,
+    "window" INTEGER NOT NULL,
+    operation TEXT NOT NULL,
+    similarity TEXT NOT NULL,
+    precision TEXT NOT NULL DEFAULT 'fp32',
+    layers TEXT NOT NULL DEFAULT '',
+    score REAL,
+    time REAL,
+    metrics TEXT NOT NULL DEFAULT '{}',
+    source TEXT,
+    created TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS results_params
+ON results (kit, language, embedding, model_name, "window", operation);
+
+CREATE INDEX IF NOT EXISTS results_source ON results (source);
+
+CREATE TABLE IF NOT EXISTS predictions (
+    result INTEGER NOT NULL REFERENCES results (id) ON DELETE CASCADE,
+    row INTEGER NOT NULL,
+    predicted REAL,
+    actual REAL,
+    predicted_sim_context1 REAL,
+    predicted_sim_context2 REAL,
+    PRIMARY KEY (result, row)
+);
+
+CREATE TABLE IF NOT EXISTS sources (
+    path TEXT PRIMARY KEY,
+    mtime REAL NOT NULL
+);
+"""
+
+
+def connect(path: str = RESULTS_PATH) -> sqlite3.Connection:
+    """Open the results store, creating it if needed."""
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    # Concurrent writers wait for each other rather than fail.
+    connection = sqlite3.connect(path, timeout=60)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA foreign_keys=ON")
+    connection.executescript(SCHEMA)
+
+    return connection
+
+
+def _score(value: float | None) -> float | None:
+    return None if value is None or isnan(value) else float(value)
+
+
+def _insert(
+    connection: sqlite3.Connection,
+    kit: Kit,
+    row: dict,
+    metrics: dict,
+    precision: str = "fp32",
+    layers: str | None = None,
+    source: str | None = None,
+) -> int:
+    cursor = connection.execute(
+        'INSERT INTO results (kit, embedding, model_name, language, "window", '
+        "operation, similarity, precision, layers, score, time, metrics, source) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (
+            kit,
+            row["embedding"],
+            row["model_name"],
+            row["language"],
+            int(row["window"]),
+            row["operation"],
+            row["similarity"],
+            precision,
+            layers or "",
+            _score(row["score"]),
+            _score(row["time"]),
+            json.dumps(metrics),
+            source,
+        ),
+    )
+
+    return cursor.lastrowid or 0
+
+
+def append_result(
+    kit: Kit,
+    params: Params,
+    score: float,
+    time: float,
+    metrics: dict | None = None,
+    predictions: DataFrame | None = None,
+    precision: str = "fp32",
+    layers: str | None = None,
+    source: str | None = None,
+    path: str = RESULTS_PATH,
+) -> int:
+    """Append a result, and its predictions if given, in one transaction."""
+
+    with closing(connect(path)) as connection:
+        with connection:
+            result = _insert(
+                connection,
+                kit,
+                {**params.to_dict(), "score": score, "time": time},
+                metrics or {},
+                precision,
+                layers,
+                source,
+            )
+
+            if predictions is not None:
+                connection.executemany(
+                    "INSERT INTO predictions (result, row, predicted, actual, "
+                    "predicted_sim_context1, predicted_sim_context2) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    [
+                        (result, index, *map(_score, values))
+                        for index, values in enumerate(
+                            predictions[prediction_columns].itertuples(index=False)
+                        )
+                    ],
+                )
+
+    return result
+
+
+def mark_source(source: str, path: str = RESULTS_PATH):
+    """Record a results CSV as imported, e.g. after writing it from the store."""
+
+    with closing(connect(path)) as connection:
+        with connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO sources (path, mtime) VALUES (?, ?)",
+                (source, os.stat(source).st_mtime),
+            )
+
+
+def _tags(source: str) -> tuple[str, str | None]:
+    # The precision and layers of a run are only in the name of its results CSV.
+    precision = re.search(r"_precision=([^_.]+)", source)
+    layers = re.search(r"_layers=(.+)\.csv$", source)
+    return (
+        precision.group(1) if precision else "fp32",
+        layers.group(1) if layers else None,
+    )
+
+
+def import_csv(source: str, kit: Kit, connection: sqlite3.Connection):
+    """Import the results of a results CSV."""
+
+    dataframe = read_csv(source)
+
+    # Older CSVs name the embedding column `model`, so the first columns are positional.
+    names = list(dataframe.columns[: len(columns)])
+    extra = list(dataframe.columns[len(columns) :])
+    dataframe = dataframe.rename(columns=dict(zip(names, columns)))
+
+    precision, layers = _tags(source)
+
+    for row in dataframe.to_dict("records"):
+        _insert(
+            connection,
+            kit,
+            row,
+            {name: row[name] for name in extra},
+            precision,
+            layers,
+            source,
+        )
+
+    connection.execute(
+        "INSERT OR REPLACE INTO sources (path, mtime) VALUES (?, ?)",
+        (source, os.stat(source).st_mtime),
+    )
+
+
+def import_csvs(path: str = RESULTS_PATH):
+    """
+    Import the new or changed results CSVs of both kits. CSVs written by runs are
+    already in the store. The results of a changed CSV supersede the earlier results of
+    its configurations, which are kept with their predictions.
+    """
+
+    with closing(connect(path)) as connection:
+        with connection:
+            imported = dict(connection.execute("SELECT path, mtime FROM sources"))
+
+            for kit in kits:
+                directory = f"results/{kit}"
+                if not os.path.isdir(directory):
+                    continue
+
+                for filename in sorted(os.listdir(directory)):
+                    source = f"{directory}/{filename}"
+                    if (
+                        filename.endswith(".csv")
+                        and not filename.endswith("_time.csv")
+                        and not filename.endswith("_top_1.csv")
+                        and imported.get(source) != os.stat(source).st_mtime
+                    ):
+                        import_csv(source, kit, connection)
+
+
+def _where(kit: Kit | None, filters: dict) -> tuple[str, list]:
+    clauses = []
+    values = []
+
+    if kit is not None:
+        clauses.append("kit = ?")
+        values.append(kit)
+
+    for name, value in filters.items():
+        if name not in filter_columns:
+            raise ValueError(f"Unknown results column: {name}")
+        if isinstance(value, (list, tuple)):
+            clauses.append(f'"{name}" IN ({", ".join("?" * len(value))})')
+            values.extend(value)
+        else:
+            clauses.append(f'"{name}" = ?')
+            values.append(value)
+
+    return " AND ".join(clauses) or "1", values
+
+
+def _latest(where: str) -> str:
+    # A configuration that was run again (e.g. with --restart) has several results, of
+    # which only the latest counts.
+    return (
+        f"SELECT * FROM (SELECT *, ROW_NUMBER() OVER (PARTITION BY {CONFIGURATION} "
+        f"ORDER BY id DESC) AS latest FROM results WHERE {where}) WHERE latest = 1"
+    )
+
+
+def query_results(
+    kit: Kit | None = None,
+    path: str = RESULTS_PATH,
+    **filters: str | int | list,
+) -> DataFrame:
+    """
+    The latest result of each configuration, in the order they were appended,
+    filtered by column (a list of values matches any of them).
+    """
+
+    where, values = _where(kit, filters)
+
+    with closing(connect(path)) as connection:
+        return read_sql_query(
+            f"SELECT {SELECT_COLUMNS} FROM ({_latest(where)}) ORDER BY id",
+            connection,
+            params=values,
+        )
+
+
+def query_best(
+    kit: Kit | None = None,
+    by: list[str] | None = None,
+    path: str = RESULTS_PATH,
+    **filters: str | int | list,
+) -> DataFrame:
+    """
+    The best of the latest results for each value of the `by` columns (the language by
+    default).
+    """
+
+    by = by or ["language"]
+    partition = ", ".join(f'"{name}"' for name in by)
+    where, values = _where(kit, filters)
+
+    with closing(connect(path)) as connection:
+        return read_sql_query(
+            f"SELECT {SELECT_COLUMNS} FROM ("
+            f"SELECT *, ROW_NUMBER() OVER ("
+            f"PARTITION BY {partition} ORDER BY score DESC, id) AS rank "
+            f"FROM ({_latest(where)})"
+            f") WHERE rank = 1 ORDER BY {partition}",
+            connection,
+            params=values,
+        )
+
+
+def completed_results(
+    kit: Kit,
+    language: str,
+    embedding: str,
+    model_name: str,
+    precision: str = "fp32",
+    layers: str | None = None,
+    path: str = RESULTS_PATH,
+) -> dict[Params, dict]:
+    """
+    The latest result of every configuration of a model that has one, unless it
+    failed (a score of 0.0 or none, as in results CSVs from before the results store),
+    so that it is retried.
+    """
+
+    with closing(connect(path)) as connection:
+        rows = connection.execute(
+            f"SELECT {SELECT_COLUMNS}, metrics FROM results "
+            "WHERE kit = ? AND language = ? AND embedding = ? AND model_name = ? "
+            "AND precision = ? AND layers = ? ORDER BY id",
+            (kit, language, embedding, model_name, precision, layers or ""),
+        ).fetchall()
+
+    results = {}
+
+    for *values, score, time, metrics in rows:
+        params = Params(values[2], values[0], values[1], *values[3:])
+        results[params] = {
+            **params.to_dict(),
+            "score": score,
+            "time": time,
+            **json.loads(metrics),
+        }
+
+    return {
+        params: result
+        for params, result in results.items()
+        if result["score"] is not None and result["score"] != 0.0
+    }
+
+
+def query_predictions(result: int, path: str = RESULTS_PATH) -> DataFrame:
+    """Predictions of a result."""
+
+    with closing(connect(path)) as connection:
+        return read_sql_query(
+            f"SELECT {', '.join(prediction_columns)} FROM predictions "
+            "WHERE result = ? ORDER BY row",
+            connection,
+            params=[result],
+        )
+
+
+if __name__ == "__main__":
+    import_csvs()
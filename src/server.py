@@ -0,0 +1,446 @@
+"""
+A script to serve predictions over HTTP. Concurrent requests are coalesced into
+micro-batches, which are predicted by warm models one batch at a time.
+
+    POST /predict  {"word1": ..., "context1": ..., ...}, or {"pairs": [...]}, with
+                   optional "params" (context_window_size, context_window_operation
+                   and similarity_measure)
+    GET  /health   status, counters and latency percentiles
+
+The embedding, model and precision are fixed by the server, so requests never load
+another model.
+"""
+
+# pylint: disable=protected-access
+
+import asyncio
+from argparse import ArgumentParser
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+from aiohttp import web
+from numpy import array, concatenate, cumsum, empty, percentile, str_
+
+from .args import add_model_arguments
+from .data import remove_strong_tags
+from .models.base import columns
+from .models.cache import hidden_state_cache, token_cache
+from .models.meta import MetaModel
+from .models.utils import ArrayFloat, ArrayStr
+from .params import operations, similarity_measures
+from .predict import input_columns
+
+ModelKey = tuple[tuple[str, object], ...]
+
+# Largest context-window size that clients may request.
+MAX_WINDOW = 50
+
+
+def client_params(params: dict | None) -> dict:
+    """Check the parameters that clients may choose."""
+
+    params = params or {}
+
+    for name, value in params.items():
+        if name == "context_window_size":
+            if (
+                not isinstance(value, int)
+                or isinstance(value, bool)
+                or not 0 <= value <= MAX_WINDOW
+            ):
+                raise ValueError(f"{name} must be an integer from 0 to {MAX_WINDOW}")
+        elif name == "context_window_operation":
+            if value not in operations:
+                raise ValueError(f"{name} must be one of {', '.join(operations)}")
+        elif name == "similarity_measure":
+            if value not in similarity_measures:
+                raise ValueError(
+                    f"{name} must be one of {', '.join(similarity_measures)}"
+                )
+        else:
+            raise ValueError(f"Unknown or fixed parameter: {name}")
+
+    return params
+
+
+def validate(x: ArrayStr) -> None:
+    """Check that every target word occurs in its context."""
+
+    for index, row in enumerate(x):
+        for _word, context, word_context in columns:
+            if not row[word_context] or row[word_context].lower() not in (
+                row[context].lower()
+            ):
+                raise ValueError(
+                    f"pair {index}: {input_columns[word_context]} "
+                    f"'{row[word_context]}' is not in {input_columns[context]}"
+                )
+
+
+class StubModel:
+    """Model that predicts from word lengths, for running the server without BERT."""
+
+    def predict_similarities(self, x: ArrayStr) -> ArrayFloat:
+        """Predict the similarities in each context and the change: (rows, 3)."""
+
+        similarities = array(
+            [
+                [
+                    1.0 / (1.0 + abs(len(row[4]) - len(row[5]))),
+                    1.0 / (1.0 + abs(len(row[6]) - len(row[7]))),
+                ]
+                for row in x
+            ]
+        ).reshape(-1, 2)
+        return concatenate(
+            [similarities, similarities[:, [1]] - similarities[:, [0]]], axis=1
+        )
+
+    def clear_cache(self) -> None:
+        """No-op."""
+
+
+def warm(model: MetaModel | StubModel) -> None:
+    """Load the model and tokenizer."""
+
+    if isinstance(model, MetaModel):
+        _ = model._estimator.model, model._estimator.tokenizer
+
+
+def predict_batch(model: MetaModel | StubModel, x: ArrayStr) -> ArrayFloat:
+    """Predict a batch, then clear the caches so that memory stays flat."""
+
+    try:
+        return model.predict_similarities(x)
+    finally:
+        hidden_state_cache.clear()
+        token_cache.clear()
+        model.clear_cache()
+
+
+class MicroBatcher:
+    """
+    Queue of requests for one model. Requests are coalesced until `max_batch` rows are
+    waiting or `max_wait` seconds have passed since the first, then predicted together
+    in the executor.
+    """
+
+    def __init__(
+        self,
+        model: MetaModel | StubModel,
+        executor: ThreadPoolExecutor,
+        max_batch: int = 64,
+        max_wait: float = 0.01,
+    ):
+        self.model = model
+        self.executor = executor
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.batches = 0
+        self.rows = 0
+        self.busy = False
+        self._queue: asyncio.Queue[tuple[ArrayStr, asyncio.Future]] = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def predict(self, x: ArrayStr) -> ArrayFloat:
+        """Predict the similarities of some rows as part of a batch."""
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((x, future))
+        return await future
+
+    async def _next_batch(self) -> list[tuple[ArrayStr, asyncio.Future]]:
+        loop = asyncio.get_running_loop()
+
+        requests = [await self._queue.get()]
+        rows = len(requests[0][0])
+        deadline = loop.time() + self.max_wait
+
+        while rows < self.max_batch:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                request = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            requests.append(request)
+            rows += len(request[0])
+
+        return requests
+
+    @property
+    def idle(self) -> bool:
+        """Whether no request is waiting or being predicted."""
+        return not self.busy and self._queue.empty()
+
+    async def _predict_each(self, requests: list[tuple[ArrayStr, asyncio.Future]]):
+        # After a batch fails, predict each request on its own, so that only the
+        # requests that fail get an error.
+        loop = asyncio.get_running_loop()
+
+        for rows, future in requests:
+            try:
+                similarities = await loop.run_in_executor(
+                    self.executor, predict_batch, self.model, rows
+                )
+            # pylint: disable=broad-exception-caught
+            except Exception as exception:
+                if not future.done():
+                    future.set_exception(exception)
+                continue
+
+            self.batches += 1
+            self.rows += len(rows)
+
+            if not future.done():
+                future.set_result(similarities)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+
+        while True:
+            requests = await self._next_batch()
+            x = concatenate([rows for rows, _future in requests])
+            self.busy = True
+
+            try:
+                similarities = await loop.run_in_executor(
+                    self.executor, predict_batch, self.model, x
+                )
+            # pylint: disable=broad-exception-caught
+            except Exception as exception:
+                if len(requests) == 1:
+                    if not requests[0][1].done():
+                        requests[0][1].set_exception(exception)
+                else:
+                    await self._predict_each(requests)
+                self.busy = False
+                continue
+
+            self.busy = False
+            self.batches += 1
+            self.rows += len(x)
+
+            ends = cumsum([len(rows) for rows, _future in requests])
+            for (rows, future), end in zip(requests, ends):
+                if not future.done():
+                    future.set_result(similarities[end - len(rows) : end])
+
+    def close(self):
+        """Stop batching."""
+        self._task.cancel()
+
+
+class Server:
+    """
+    Warm models (with their batchers) keyed by parameters, and request statistics.
+    Beyond `max_models` batchers, the least recently used idle batchers are closed.
+    """
+
+    def __init__(
+        self,
+        default_params: dict,
+        stub: bool = False,
+        max_batch: int = 64,
+        max_wait: float = 0.01,
+        latency_window: int = 10000,
+        max_models: int = 16,
+    ):
+        self.default_params = default_params
+        self.stub = stub
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.max_models = max_models
+        self.requests = 0
+        self.errors = 0
+        self.latencies: deque[float] = deque(maxlen=latency_window)
+        # One model runs at a time: the caches are shared and torch uses every core.
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._batchers: OrderedDict[ModelKey, MicroBatcher] = OrderedDict()
+        self._lock = asyncio.Lock()
+
+    async def batcher(self, params: dict | None = None) -> MicroBatcher:
+        """
+        Get the batcher for some client parameters, loading the model if necessary.
+        Invalid parameters raise a ValueError.
+        """
+
+        params = {**self.default_params, **client_params(params)}
+        key = tuple(sorted(params.items()))
+
+        async with self._lock:
+            if key not in self._batchers:
+                model = StubModel() if self.stub else MetaModel(**params)
+                # Load the model before the first batch, without blocking the loop.
+                await asyncio.get_running_loop().run_in_executor(
+                    self._executor, warm, model
+                )
+                self._batchers[key] = MicroBatcher(
+                    model, self._executor, self.max_batch, self.max_wait
+                )
+                self._evict(key)
+
+            self._batchers.move_to_end(key)
+            return self._batchers[key]
+
+    def _evict(self, keep: ModelKey):
+        for key in list(self._batchers):
+            if len(self._batchers) <= self.max_models:
+                break
+            if key != keep and self._batchers[key].idle:
+                self._batchers.pop(key).close()
+
+    async def predict(self, request: web.Request) -> web.Response:
+        """Predict the similarities of one pair or a list of pairs."""
+
+        start = perf_counter()
+        self.requests += 1
+
+        try:
+            body = await request.json()
+            pairs = body["pairs"] if "pairs" in body else [body]
+            x = array(
+                [
+                    [
+                        remove_strong_tags(str(pair[column]))
+                        if column in ["context1", "context2"]
+                        else str(pair[column])
+                        for column in input_columns
+                    ]
+                    for pair in pairs
+                ],
+                dtype=str_,
+            ).reshape(-1, len(input_columns))
+            validate(x)
+            batcher = await self.batcher(body.get("params"))
+        except (ValueError, KeyError, TypeError, OSError) as exception:
+            self.errors += 1
+            return web.json_response({"error": str(exception)}, status=400)
+
+        try:
+            similarities = await batcher.predict(x) if len(x) else empty((0, 3))
+        # pylint: disable=broad-exception-caught
+        except Exception as exception:
+            self.errors += 1
+            return web.json_response({"error": str(exception)}, status=500)
+
+        predictions = [
+            {
+                "predicted": float(change),
+                "predicted_sim_context1": float(sim_context1),
+                "predicted_sim_context2": float(sim_context2),
+            }
+            for sim_context1, sim_context2, change in similarities
+        ]
+
+        self.latencies.append(perf_counter() - start)
+
+        if "pairs" in body:
+            return web.json_response({"predictions": predictions})
+        return web.json_response(predictions[0])
+
+    async def health(self, _request: web.Request) -> web.Response:
+        """Status, counters and latency percentiles (ms)."""
+
+        latencies = array(self.latencies) * 1000.0
+        return web.json_response(
+            {
+                "status": "ok",
+                "models": [dict(key) for key in self._batchers],
+                "requests": self.requests,
+                "errors": self.errors,
+                "batches": sum(batcher.batches for batcher in self._batchers.values()),
+                "rows": sum(batcher.rows for batcher in self._batchers.values()),
+                "latency_ms": {
+                    f"p{q}": float(percentile(latencies, q)) if len(latencies) else None
+                    for q in [50, 90, 99]
+                },
+            }
+        )
+
+    async def on_startup(self, _app: web.Application):
+        """Warm up the default model."""
+        await self.batcher()
+
+    async def on_cleanup(self, _app: web.Application):
+        """Stop the batchers and the executor."""
+        for batcher in self._batchers.values():
+            batcher.close()
+        self._executor.shutdown(wait=False)
+
+    def app(self) -> web.Application:
+        """Web application."""
+
+        application = web.Application()
+        application.add_routes(
+            [web.post("/predict", self.predict), web.get("/health", self.health)]
+        )
+        application.on_startup.append(self.on_startup)
+        application.on_cleanup.append(self.on_cleanup)
+        return application
+
+
+def serve():
+    """Serve predictions."""
+
+    parser = ArgumentParser()
+
+    add_model_arguments(parser)
+
+    parser.add_argument("--host", default="127.0.0.1", help="host")
+    parser.add_argument("--port", type=int, default=8080, help="port")
+
+    parser.add_argument(
+        "--max-batch",
+        type=int,
+        default=64,
+        help="rows per micro-batch",
+    )
+
+    parser.add_argument(
+        "--max-wait",
+        type=float,
+        default=10.0,
+        help="longest wait for a micro-batch to fill (ms)",
+    )
+
+    parser.add_argument(
+        "--max-models",
+        type=int,
+        default=16,
+        help="most warm parameter combinations (the least recently used idle ones "
+        "are closed)",
+    )
+
+    parser.add_argument(
+        "--stub",
+        action="store_true",
+        help="serve a stub model (no pre-trained model is loaded)",
+    )
+
+    args = parser.parse_args()
+
+    server = Server(
+        {
+            "model": args.embedding,
+            "model_name": args.model_name,
+            "context_window_size": args.window,
+            "context_window_operation": args.operation,
+            "similarity_measure": args.similarity,
+            "batch_size": args.batch_size,
+            "precision": args.precision,
+            "layers": args.layers,
+        },
+        args.stub,
+        args.max_batch,
+        args.max_wait / 1000.0,
+        max_models=args.max_models,
+    )
+
+    web.run_app(server.app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    serve()
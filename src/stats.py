@@ -1,11 +1,9 @@
 """Statistical tests."""
 
-# pylint: disable=redefined-outer-name
+# pylint: disable=redefined-outer-name,import-outside-toplevel
 
 from numpy import array
 from pandas import read_csv
-from scikit_posthocs import posthoc_nemenyi_friedman
-from scipy.stats import friedmanchisquare, ttest_rel
 
 from .params import Params
 
@@ -27,6 +25,8 @@ def read(prefix: str, params: Params):
 def t_test(prefix: str, params1: Params, params2: Params):
     """Dependent t-test for two paired samples."""
 
+    from scipy.stats import ttest_rel
+
     statistic, pvalue = ttest_rel(read(prefix, params1), read(prefix, params2))
 
     return statistic, pvalue
@@ -35,6 +35,9 @@ def t_test(prefix: str, params1: Params, params2: Params):
 def nemenyi_test(prefix: str, paramss: tuple[Params, ...]):
     """Nemenyi test for N paired samples."""
 
+    from scikit_posthocs import posthoc_nemenyi_friedman
+    from scipy.stats import friedmanchisquare
+
     if len(set(params.language for params in paramss)) > 1:
         raise ValueError("Samples must be from the same language")
 
@@ -1,17 +1,32 @@
 """A script to run subtask 1 experiments."""
 
+# pylint: disable=protected-access
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from itertools import product
 from math import isnan
-from os import makedirs
+from multiprocessing import get_context
+from os import cpu_count, makedirs
 from time import perf_counter
 
 from numpy import ndarray
 from pandas import DataFrame
 
-from .args import parse_args
-from .data import load_x, load_y
+from .args import Args, parse_args
+from .compiled import load_compiled
+from .models.base import subtask2_scores
+from .models.cache import hidden_state_cache, token_cache
+from .models.export import export_static, static_table
+from .models.memo import prediction_memo
+from .models.memory import memory_tracker
 from .models.meta import MetaModel
+from .models.pool import model_pool
+from .models.store import prime
+from .models.sweep import sweep_scores
+from .models.timing import timer
+from .models.utils import Embedding, Precision
 from .params import Params, get_model_names
+from .results import Kit, append_result, completed_results, import_csvs, mark_source
 
 
 def line():
@@ -23,10 +38,26 @@ def run_experiment(
     x: ndarray,
     y: ndarray,
     params: Params,
+    batch_size: int = 32,
+    gold: ndarray | None = None,
+    precision: Precision = "fp32",
+    layers: str | None = None,
+    memo: bool = False,
 ):
-    """Run an experiment."""
+    """
+    Run an experiment, returning the score, time, metrics and predictions (also written
+    to results/predictions). If the gold-standard similarities are given, also compute
+    the subtask 2 scores from the same predictions. If timing or memory tracking is
+    enabled, the metrics also include the time and calls of each stage or the peak
+    memory. With the row memo, they include its hits and misses.
+    """
     score = 0.0
     time = 0.0
+    metrics: dict[str, float | None] = {}
+    predictions: DataFrame | None = None
+
+    timer.reset()
+    prediction_memo.reset()
 
     try:
         start = perf_counter()
@@ -36,18 +67,32 @@ def run_experiment(
             params.window,
             params.operation,
             params.similarity,
+            batch_size,
+            precision,
+            layers,
+            memo,
         )
-        score = model.score(x, y)
+        with memory_tracker:
+            evaluation = model.evaluate(x, y)
+        score = evaluation.score
         time = perf_counter() - start
 
-        directory = "results/predictions"
-        makedirs(directory, exist_ok=True)
-        DataFrame(
+        predictions = DataFrame(
             {
-                "predicted": model.predict(x),
+                "predicted": evaluation.predictions,
                 "actual": y,
+                "predicted_sim_context1": evaluation.similarities[:, 0],
+                "predicted_sim_context2": evaluation.similarities[:, 1],
             }
-        ).to_csv(f"{directory}/{params.filename}", index=False)
+        )
+
+        # The report plots the predictions from their CSVs.
+        directory = "results/predictions"
+        makedirs(directory, exist_ok=True)
+        predictions.to_csv(f"{directory}/{params.filename}", index=False)
+
+        if gold is not None:
+            metrics.update(subtask2_scores(evaluation.similarities, gold))
 
     # pylint: disable=broad-exception-caught
     except Exception as exception:
@@ -56,7 +101,320 @@ def run_experiment(
     if isnan(score):
         score = 0.0
 
-    return score, time
+    if timer.enabled:
+        metrics.update(timer.results())
+
+    if memory_tracker.enabled:
+        metrics.update(memory_tracker.results())
+
+    if memo:
+        metrics.update(prediction_memo.results())
+
+    return score, time, metrics, predictions
+
+
+def run_sweep(
+    x: ndarray,
+    y: ndarray,
+    params: Params,
+    windows: list[int],
+    operations: list[str],
+    batch_size: int = 32,
+    precision: Precision = "fp32",
+    layers: str | None = None,
+):
+    """
+    Run the experiments for every window and operation in one pass, returning no
+    results if the sweep fails. If memory tracking is enabled, every experiment gets
+    the peak memory of the sweep.
+    """
+    scores = DataFrame(columns=["window", "operation", "score"])
+    time = 0.0
+    metrics: dict[str, float | None] = {}
+
+    try:
+        start = perf_counter()
+        model = MetaModel(
+            params.embedding,
+            params.model_name,
+            similarity_measure=params.similarity,
+            batch_size=batch_size,
+            precision=precision,
+            layers=layers,
+        )
+        with memory_tracker:
+            scores = sweep_scores(model._estimator, x, y, windows, operations)
+        time = perf_counter() - start
+
+        if memory_tracker.enabled:
+            metrics.update(memory_tracker.results())
+
+    # pylint: disable=broad-exception-caught
+    except Exception as exception:
+        print(exception)
+        return []
+
+    results = []
+
+    for window, operation in product(windows, operations):
+        score = scores[
+            (scores["window"] == window) & (scores["operation"] == operation)
+        ]["score"]
+        results.append(
+            (
+                params._replace(window=window, operation=operation),
+                0.0 if score.empty or isnan(score.iloc[0]) else score.iloc[0],
+                # The time of the sweep is shared equally between its experiments.
+                time / (len(windows) * len(operations)),
+                metrics,
+            )
+        )
+
+    return results
+
+
+def prime_model(
+    args: Args, language: str, embedding: Embedding, model_name: str, x: ndarray
+) -> dict[str, float | None]:
+    """
+    Export the static embeddings or prime the hidden-state cache of a model, returning
+    the time of priming and of its stages and their calls if timing is enabled, and its
+    peak memory if memory tracking is enabled. Priming serves every configuration of
+    the model, so its cost isn't part of theirs.
+    """
+
+    timer.reset()
+    start = perf_counter()
+
+    with memory_tracker:
+        # Static models read their exported embeddings, without loading the
+        # transformer.
+        if embedding == "static" and args.store:
+            if static_table(model_name, args.precision) is None:
+                export_static(model_name, args.precision)
+
+        if embedding != "static" and args.store:
+            prime(
+                MetaModel(
+                    embedding,
+                    model_name,
+                    batch_size=args.batch_size,
+                    precision=args.precision,
+                    layers=args.layers,
+                )._estimator,
+                list(x[:, 2]) + list(x[:, 3]),
+                language,
+                args.practice,
+            )
+
+    metrics: dict[str, float | None] = {}
+
+    if timer.enabled:
+        metrics["prime_time"] = perf_counter() - start
+        metrics.update(
+            {f"prime_{name}": value for name, value in timer.results().items()}
+        )
+
+    if memory_tracker.enabled:
+        metrics.update(
+            {f"prime_{name}": value for name, value in memory_tracker.results().items()}
+        )
+
+    return metrics
+
+
+def run_model(args: Args, language: str, embedding: Embedding, model_name: str):
+    """
+    Run the experiments for one embedding and model, appending each result to the
+    results store as soon as it is finished. Finished configurations are read from the
+    store instead of being run again.
+    """
+
+    kit: Kit = "practice" if args.practice else "evaluation"
+    source = f"{args.directory}/{args.filename}"
+
+    # Configurations that already have a result are skipped, unless restarting.
+    completed = (
+        {}
+        if args.restart
+        else completed_results(
+            kit, language, embedding, model_name, args.precision, args.layers
+        )
+    )
+    configurations = [
+        Params(language, embedding, model_name, window, operation, similarity)
+        for window, operation, similarity in product(
+            args.get_windows(), args.operation, args.similarity
+        )
+    ]
+    pending = [params for params in configurations if params not in completed]
+
+    if not pending:
+        print(f"language = {language}, model_name = {model_name}: completed")
+        line()
+        return [completed[params] for params in configurations]
+
+    x, gold = load_compiled(model_name, language, args.practice)
+    y = gold[:, 2]
+    n = len(x)
+
+    print(
+        f"language = {language}, model_name = {model_name}, n = {n}, "
+        f"completed = {len(configurations) - len(pending)}/{len(configurations)}"
+    )
+    line()
+
+    # The cached hidden states serve every window, operation and similarity.
+    hidden_state_cache.clear()
+
+    prime_metrics = prime_model(args, language, embedding, model_name, x)
+
+    results = []
+
+    if args.sweep:
+        for similarity in args.similarity:
+            swept = {}
+            sweep_pending = [
+                params for params in pending if params.similarity == similarity
+            ]
+
+            # Sweep only the windows and operations of unfinished configurations.
+            if sweep_pending:
+                swept = {
+                    result[0]: result
+                    for result in run_sweep(
+                        x,
+                        y,
+                        Params(language, embedding, model_name, 0, "none", similarity),
+                        sorted({params.window for params in sweep_pending}),
+                        [
+                            operation
+                            for operation in args.operation
+                            if any(
+                                params.operation == operation
+                                for params in sweep_pending
+                            )
+                        ],
+                        args.batch_size,
+                        args.precision,
+                        args.layers,
+                    )
+                }
+
+            for window, operation in product(args.get_windows(), args.operation):
+                params = Params(
+                    language, embedding, model_name, window, operation, similarity
+                )
+
+                if params in completed:
+                    results.append(completed[params])
+                    continue
+
+                print(params)
+
+                if params in swept:
+                    _params, score, time, metrics = swept[params]
+                    metrics = {**prime_metrics, **metrics}
+                    append_result(
+                        kit,
+                        params,
+                        score,
+                        time,
+                        metrics,
+                        precision=args.precision,
+                        layers=args.layers,
+                        source=source,
+                    )
+                else:
+                    score, time, metrics = 0.0, 0.0, {}
+
+                results.append(
+                    {**params.to_dict(), "score": score, "time": time, **metrics}
+                )
+                print(f"score = {score:.3f}")
+                line()
+
+        return results
+
+    for params in configurations:
+        if params in completed:
+            results.append(completed[params])
+            continue
+
+        print(params)
+
+        score, time, metrics, predictions = run_experiment(
+            x,
+            y,
+            params,
+            args.batch_size,
+            gold if args.subtask2 else None,
+            args.precision,
+            args.layers,
+            args.memo,
+        )
+        metrics = {**prime_metrics, **metrics}
+
+        # Failed experiments are not stored, so that they are retried.
+        if predictions is not None:
+            append_result(
+                kit,
+                params,
+                score,
+                time,
+                metrics,
+                predictions,
+                args.precision,
+                args.layers,
+                source,
+            )
+
+        results.append({**params.to_dict(), "score": score, "time": time, **metrics})
+
+        print(f"score = {score:.3f}")
+        print(f"time = {n} x {(time / n):.6f} = {time:.3f} s")
+        line()
+
+    return results
+
+
+def run_unit(args: Args, language: str, model_name: str):
+    """Run the experiments for one language and model (every embedding)."""
+
+    token_cache.clear()
+
+    try:
+        return [
+            result
+            for embedding in args.embedding
+            for result in run_model(args, language, embedding, model_name)
+        ]
+    finally:
+        # Every embedding of the model shares it, but the next unit doesn't need it.
+        model_pool.clear()
+
+
+def init_worker(args: Args, threads: int):
+    """Initialise a worker process."""
+
+    # pylint: disable-next=import-outside-toplevel
+    from torch import set_num_threads
+
+    set_num_threads(threads)
+    model_pool.max_bytes = args.max_model_bytes
+    timer.enabled = args.timing
+    memory_tracker.enabled = args.memory
+
+
+def save_results(args: Args, results: list[dict]):
+    """
+    Save the results CSV of a run. Its results are already in the results store, so
+    the CSV is marked as imported.
+    """
+
+    filename = f"{args.directory}/{args.filename}"
+    DataFrame(results).to_csv(filename, index=False)
+    mark_source(filename)
 
 
 def run_experiments():
@@ -70,6 +428,13 @@ def run_experiments():
 
     makedirs(args.directory, exist_ok=True)
 
+    # Results CSVs from before the results store also count as finished.
+    import_csvs()
+
+    model_pool.max_bytes = args.max_model_bytes
+    timer.enabled = args.timing
+    memory_tracker.enabled = args.memory
+
     languages = args.language
 
     # There is no `practice kit' for Finnish.
@@ -78,37 +443,42 @@ def run_experiments():
 
     results = []
 
+    if args.jobs > 1:
+        # Each worker loads its own models, so split the cores between the workers.
+        threads = max(1, (cpu_count() or 1) // args.jobs)
+
+        with ProcessPoolExecutor(
+            max_workers=args.jobs,
+            mp_context=get_context("spawn"),
+            initializer=init_worker,
+            initargs=(args, threads),
+        ) as executor:
+            futures = [
+                executor.submit(run_unit, args, language, model_name)
+                for language in languages
+                for model_name in args.model_name or get_model_names(language)
+            ]
+
+            for future in as_completed(futures):
+                results.extend(future.result())
+                save_results(args, results)
+
+        return
+
     for language in languages:
         model_names = args.model_name
         if model_names == []:
             model_names = get_model_names(language)
 
-        x = load_x(language, args.practice).to_numpy()
-        y = load_y(language, args.practice).to_numpy()[:, 2]
-        n = len(x)
-
-        print(f"language = {language}, n = {n}")
-        line()
-
-        for params in product(
-            args.embedding,
-            model_names,
-            args.get_windows(),
-            args.operation,
-            args.similarity,
-        ):
-            params = Params(language, *params)
-            print(params)
-
-            score, time = run_experiment(x, y, params)
+        token_cache.clear()
 
-            results.append({**params.to_dict(), "score": score, "time": time})
+        for embedding, model_name in product(args.embedding, model_names):
+            results.extend(run_model(args, language, embedding, model_name))
 
-            print(f"score = {score:.3f}")
-            print(f"time = {n} x {(time / n):.6f} = {time:.3f} s")
-            line()
+            # The models are run in turn, so only one is kept loaded.
+            model_pool.clear()
 
-        DataFrame(results).to_csv(f"{args.directory}/{args.filename}", index=False)
+        save_results(args, results)
 
 
 if __name__ == "__main__":
@@ -1,34 +1,22 @@
 """A script to get the best results and generate additional data for the report."""
 
-# pylint: disable=protected-access
-
-import os
+# pylint: disable=protected-access,import-outside-toplevel
 
 from numpy import average
-from pandas import DataFrame, concat, read_csv
+from pandas import DataFrame
 
 from .data import Language, default_languages, load_x
-from .models.static import StaticBertModel
-
-columns = [
-    "embedding",
-    "model_name",
-    "language",
-    "window",
-    "operation",
-    "similarity",
-    "score",
-    "time",
-]
-
-
-def _get_top_1_model_name(filename: str):
-    read_csv(filename, header=0, names=columns).sort_values(
-        by=["score"], ascending=False
-    ).groupby("model_name").head(1).reset_index(drop=True).sort_values(
-        by=["model_name"]
-    ).to_csv(
-        filename.replace(".csv", "_top_1.csv"), index=False
+from .results import Kit, import_csvs, query_best, query_results
+
+
+def _get_top_1_model_name(dataframe: DataFrame, filename: str):
+    (
+        dataframe.sort_values(by=["score"], ascending=False)
+        .groupby("model_name")
+        .head(1)
+        .reset_index(drop=True)
+        .sort_values(by=["model_name"])
+        .to_csv(filename.replace(".csv", "_top_1.csv"), index=False)
     )
 
 
@@ -40,58 +28,31 @@ ns: dict[Language, int] = {
 }
 
 
-def _get_time_per_instance(filename: str, n: int):
-    dataframe = read_csv(filename, header=0, names=columns)
+def _get_time_per_instance(dataframe: DataFrame, filename: str, n: int):
+    dataframe = dataframe.copy()
     dataframe["time"] = dataframe["time"] / n
     dataframe.to_csv(filename.replace(".csv", "_time.csv"), index=False)
 
 
 def _get_results(practice: bool = False):
-    results_directory = "practice" if practice else "evaluation"
-
-    dataframes: list[DataFrame] = []
-    for filename in os.listdir(f"results/{results_directory}"):
-        if (
-            filename.endswith(".csv")
-            and not filename.endswith("_time.csv")
-            and not filename.endswith("_top_1.csv")
-        ):
-            dataframes.append(
-                read_csv(
-                    f"results/{results_directory}/{filename}",
-                    header=0,
-                    names=columns,
-                )
-            )
-
-    return concat(dataframes)
+    import_csvs()
+    return query_results("practice" if practice else "evaluation")
 
 
 def _get_best(practice: bool = False, operations: list[str] | None = None):
-    results_directory = "practice" if practice else "evaluation"
+    kit: Kit = "practice" if practice else "evaluation"
 
     operations = operations or ["sum", "prod", "concat"]
 
-    dataframe = _get_results(practice)
+    import_csvs()
 
-    dataframe = dataframe[dataframe["operation"].isin(operations)]
-
-    dataframe = dataframe.sort_values(by=["score"], ascending=False)
-
-    dataframe.groupby(["language"]).head(1).reset_index(drop=True).sort_values(
-        by=["language"]
-    ).to_csv(f"results/best/{results_directory}_best_overall.csv", index=False)
+    query_best(kit, operation=operations).to_csv(
+        f"results/best/{kit}_best_overall.csv", index=False
+    )
 
     for embedding in ["static", "contextual", "pooled"]:
-        (
-            dataframe[dataframe["embedding"] == embedding]
-            .groupby(["language"])
-            .head(1)
-            .reset_index(drop=True)
-            .sort_values(by=["language"])
-            .to_csv(
-                f"results/best/{results_directory}_best_{embedding}.csv", index=False
-            )
+        query_best(kit, operation=operations, embedding=embedding).to_csv(
+            f"results/best/{kit}_best_{embedding}.csv", index=False
         )
 
 
@@ -153,6 +114,8 @@ def _get_filename(
 
 
 def _process_results():
+    import_csvs()
+
     for language in default_languages:
         for filename in [
             _get_filename(False, language, "static", 0, 50, "sum", "cosine"),
@@ -161,17 +124,23 @@ def _process_results():
             _get_filename(False, language, "contextual", 0, 10, "concat", "cosine"),
             _get_filename(False, language, "pooled", 0, 10, "sum", "cosine"),
         ]:
-            _get_top_1_model_name(filename)
-            _get_time_per_instance(filename, ns[language])
+            # Each file is read once, from the store.
+            dataframe = query_results(source=filename)
+            _get_top_1_model_name(dataframe, filename)
+            _get_time_per_instance(dataframe, filename, ns[language])
 
 
 def _get_token_examples():
+    # The models are only needed here, so don't import them for the CSV reports.
+    from .compiled import load_compiled
+    from .models.static import StaticBertModel
+
     row = 2
 
     for language in default_languages:
         print(f"language = {language}")
 
-        x = load_x(language).to_numpy()
+        x, _y = load_compiled("bert-base-multilingual-uncased", language)
 
         for window in [0, 1, 2, 3]:
             model = StaticBertModel(